@@ -0,0 +1,65 @@
+"""
+Compare the old per-row reflection CSV export with the streaming CsvTableWriter.
+
+Run from the repository root: python -m benchmarks.csv_export [rows]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+
+from exports.csv import CsvTableWriter, TABLE_COLUMNS
+from sql.zot_music import Session
+
+
+def make_sessions(count):
+    start = datetime(2023, 1, 2)
+    return [
+        Session(session_id=f"session_{i}", user_id=f"user_{i % 1000}", record_id=f"record_{i % 5000}",
+                track_number=i % 12 + 1, initiate_at=start + timedelta(seconds=i),
+                leave_at=start + timedelta(seconds=i + 200), music_quality="normal", device="mobile-app",
+                remaining_time=180, replay_count=None if i % 5 == 0 else i % 6)
+        for i in range(count)
+    ]
+
+
+def legacy_export(output_dir, sessions):
+    # The export path before CsvTableWriter: inspect() per object, a dict per row, DictWriter
+    rows = []
+    for obj in sessions:
+        rows.append({column.key: getattr(obj, column.key) for column in inspect(obj).mapper.column_attrs})
+    with open(os.path.join(output_dir, 'Sessions.csv'), mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=TABLE_COLUMNS['Sessions'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def streaming_export(output_dir, sessions):
+    writer = CsvTableWriter('Sessions', output_dir)
+    writer.write(sessions)
+    writer.close()
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sessions = make_sessions(count)
+
+    with tempfile.TemporaryDirectory() as before_dir, tempfile.TemporaryDirectory() as after_dir:
+        before = timed(legacy_export, before_dir, sessions)
+        after = timed(streaming_export, after_dir, sessions)
+        with open(os.path.join(before_dir, 'Sessions.csv'), 'rb') as a, open(os.path.join(after_dir, 'Sessions.csv'), 'rb') as b:
+            identical = a.read() == b.read()
+
+    print(f"before: {before:.2f}s ({count / before:,.0f} rows/s)")
+    print(f"after:  {after:.2f}s ({count / after:,.0f} rows/s)")
+    print(f"speedup: {before / after:.1f}x, identical output: {identical}")
@@ -0,0 +1,148 @@
+"""
+Time every create_* generator, the CSV export and loading into SQLite (a local stand-in for MySQL) at several
+scale factors, and flag steps whose time grows faster than their row count.
+
+Run from the repository root: python -m benchmarks.suite [--scales 1,10,100] [--output report.json]
+Scale factor 1 uses the counts in constants.py; factor k multiplies every row count by k.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from constants import GeneratorConfig, Seed
+from exports.csv import convert_objects_to_dict, export_csvs
+from generators.listener_like_review import create_review_likes
+from generators.listener_review_record import create_reviews
+from generators.listener_session_song import create_sessions
+from generators.record_single_album_song import create_records_singles_albums_songs, create_catalog_batches
+from generators.seeds import reseed
+from generators.text_pool import TEXT_POOL_KINDS, build_text_pool
+from generators.user_artist_listener import create_users_listeners_artists, create_user_batches
+from sql.bulk_load import BulkInserter, OrmLoader
+from sql.zot_music import Base, User, Artist, Listener, Record, Single, Album, Song, Session, Review, ReviewLike
+
+# Tables in foreign key order, as loaded into the database
+MODELS = [User, Artist, Listener, Record, Single, Album, Song, Session, Review, ReviewLike]
+
+
+def run_scale(factor):
+    """
+    Run every benchmark once at one scale factor and return {benchmark: {'rows': n, 'seconds': s}}.
+    """
+    results = {}
+
+    def timed(name, function, *args, rows=None):
+        start = time.perf_counter()
+        value = function(*args)
+        seconds = time.perf_counter() - start
+        results[name] = {'rows': rows(value) if rows else len(value), 'seconds': seconds}
+        print(f"  {name:<40} {results[name]['rows']:>10,} rows {seconds:>9.3f}s")
+        return value
+
+    # Same random streams at every scale. The columnar engines draw from their own NumPy generators,
+    # so they leave the streams of the next tables alone.
+    reseed(Seed)
+    config = GeneratorConfig(scale_factor=factor)
+
+    users, listeners, artists = timed('create_users_listeners_artists', create_users_listeners_artists, config,
+                                      rows=lambda value: sum(map(len, value)))
+    timed('create_user_batches', create_user_batches, config, rows=lambda value: sum(map(len, value)))
+    records, singles, albums, songs = timed('create_records_singles_albums_songs',
+                                            create_records_singles_albums_songs, artists, config,
+                                            rows=lambda value: sum(map(len, value)))
+    timed('create_catalog_batches', create_catalog_batches, artists, config, rows=lambda value: sum(map(len, value)))
+    sessions = timed('create_sessions', create_sessions, listeners, songs, config)
+    reviews = timed('create_reviews', create_reviews, listeners, records, config)
+    review_likes = timed('create_review_likes', create_review_likes, reviews, listeners, config)
+
+    tables = [users, artists, listeners, records, singles, albums, songs, sessions, reviews, review_likes]
+    total_rows = sum(map(len, tables))
+    timed('convert_objects_to_dict', lambda: [convert_objects_to_dict(objects) for objects in tables],
+          rows=lambda value: total_rows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        timed('export_csvs', export_csvs, users, listeners, artists, records, singles, albums, songs,
+              sessions, reviews, review_likes, directory, rows=lambda value: total_rows)
+
+        # The ORM load comes last: it attaches the objects to its session
+        for loader in ('bulk', 'orm'):
+            engine = create_engine(f"sqlite:///{os.path.join(directory, f'{loader}.sqlite')}")
+            Base.metadata.create_all(engine)
+            session = sessionmaker(bind=engine)()
+
+            def load():
+                for model, objects in zip(MODELS, tables):
+                    sink = BulkInserter(engine, model) if loader == 'bulk' else OrmLoader(session, model)
+                    sink.write(objects)
+                    sink.close()
+                return total_rows
+
+            timed(f'sqlite {loader} load', load, rows=lambda value: value)
+            session.close()
+            engine.dispose()
+    return results
+
+
+def scaling_exponents(runs):
+    """
+    For every benchmark, the exponent b of seconds ~ rows ** b between consecutive scale factors
+    (1 is linear, 2 quadratic).
+    """
+    exponents = {}
+    for (_, small), (_, large) in zip(runs, runs[1:]):
+        for name, result in large.items():
+            before = small[name]
+            if before['seconds'] > 0 and result['rows'] > before['rows'] > 0:
+                exponent = math.log(result['seconds'] / before['seconds']) / math.log(result['rows'] / before['rows'])
+                exponents.setdefault(name, []).append(exponent)
+    return exponents
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,10,100', help="comma-separated scale factors (default 1,10,100)")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="flag a benchmark whose scaling exponent exceeds 1 + tolerance (default 0.2)")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    args = parser.parse_args()
+    scales = sorted(float(scale) for scale in args.scales.split(','))
+
+    # Build the text pools before timing anything, so no scale pays for them
+    for kind in TEXT_POOL_KINDS:
+        build_text_pool(kind)
+
+    runs = []
+    for scale in scales:
+        print(f"Scale {scale:g}x")
+        runs.append((scale, run_scale(scale)))
+
+    exponents = scaling_exponents(runs)
+    nonlinear = []
+    print(f"\n{'benchmark':<40} " + ' '.join(f"{f'{scale:g}x rows/s':>14}" for scale, _ in runs) + "  exponent")
+    for name in runs[0][1]:
+        rates = []
+        for _, results in runs:
+            result = results[name]
+            rates.append(f"{result['rows'] / result['seconds']:>14,.0f}" if result['seconds'] > 0 else f"{'':>14}")
+        worst = max(exponents.get(name, [1.0]))
+        flag = "  NONLINEAR" if worst > 1 + args.tolerance else ""
+        if flag:
+            nonlinear.append(name)
+        print(f"{name:<40} {' '.join(rates)}  {worst:>8.2f}{flag}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'scales': scales, 'tolerance': args.tolerance, 'nonlinear': nonlinear,
+                       'exponents': exponents, 'runs': [results for _, results in runs]}, file, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if nonlinear:
+        print(f"Nonlinear scaling: {', '.join(nonlinear)}")
+        sys.exit(1)
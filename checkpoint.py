@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import random
+import types
+
+import faker.generator
+
+import constants
+from generators import ids
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def current_settings():
+    """Every setting in constants.py, rendered with repr() so it can go into JSON."""
+    return {
+        name: repr(value) for name, value in sorted(vars(constants).items())
+        if not name.startswith('_') and not isinstance(value, (types.ModuleType, types.FunctionType, type))
+    }
+
+
+def config_fingerprint(config=None):
+    """
+    Hash of every setting in constants.py and of the dataset's GeneratorConfig.
+    A run only resumes a manifest written with the same settings.
+    """
+    settings = current_settings()
+    settings['config'] = repr(config)
+    return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
+
+def capture_rng_state(rng=None):
+    """
+    Snapshot, as JSON-friendly values, every random stream the generators draw from: the random module,
+    the random instance shared by all Faker objects, the id counters and (when given) a NumPy generator.
+    """
+    version, internal, gauss = random.getstate()
+    faker_version, faker_internal, faker_gauss = faker.generator.random.getstate()
+    return {
+        'random': [version, list(internal), gauss],
+        'faker': [faker_version, list(faker_internal), faker_gauss],
+        'id_counters': dict(ids._counters),
+        'numpy': rng.bit_generator.state if rng is not None else None,
+    }
+
+
+def restore_rng_state(state, rng=None):
+    """Put the random streams back into a state captured by capture_rng_state."""
+    version, internal, gauss = state['random']
+    random.setstate((version, tuple(internal), gauss))
+    faker_version, faker_internal, faker_gauss = state['faker']
+    faker.generator.random.setstate((faker_version, tuple(faker_internal), faker_gauss))
+    ids._counters.clear()
+    ids._counters.update(state['id_counters'])
+    if rng is not None and state['numpy'] is not None:
+        rng.bit_generator.state = state['numpy']
+
+
+class Checkpoint:
+    """
+    Manifest of a generation run in <checkpoint_dir>/manifest.json. For every table (and load step) it records
+    how many chunks and rows are completely written, where every sink stands after them (see the sinks' sync()),
+    and the random state at the start of the table and after the last completed chunk.
+
+    If the manifest left behind by an interrupted run was written with the same settings, the new run resumes it;
+    otherwise (or after a completed run) it starts over.
+    """
+
+    def __init__(self, checkpoint_dir, config=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.path = os.path.join(checkpoint_dir, MANIFEST_NAME)
+        fingerprint = config_fingerprint(config)
+
+        manifest = None
+        if os.path.exists(self.path):
+            with open(self.path) as file:
+                manifest = json.load(file)
+        self.resuming = manifest is not None and manifest['fingerprint'] == fingerprint and not manifest['complete']
+        if self.resuming:
+            print(f"Resuming the interrupted run recorded in {self.path}")
+        else:
+            if manifest is not None and not manifest['complete']:
+                print(f"Settings changed since the interrupted run in {self.path}; starting over")
+            manifest = {'fingerprint': fingerprint, 'complete': False, 'tables': {}}
+        self.manifest = manifest
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self._save()
+
+    def _save(self):
+        # Replace the manifest atomically so a crash never leaves half of it behind
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(self.manifest, file)
+        os.replace(temporary_path, self.path)
+
+    def table(self, name):
+        """Progress recorded for a table or step (an empty dict if nothing was recorded)."""
+        return self.manifest['tables'].get(name, {})
+
+    def update(self, name, **progress):
+        """Record progress of a table or step and save the manifest."""
+        self.manifest['tables'].setdefault(name, {}).update(progress)
+        self._save()
+
+    def finish_table(self, name, rows, rng_state):
+        """Mark a table as done; only its row count and the random state after it are kept."""
+        self.manifest['tables'][name] = {'done': True, 'rows': rows, 'end_rng': rng_state}
+        self._save()
+
+    def id_log_path(self, name):
+        return os.path.join(self.checkpoint_dir, f'{name}.ids')
+
+    def finish(self):
+        """Mark the run as complete, so the next run starts over."""
+        self.manifest['complete'] = True
+        self._save()
+
+
+class IdLog:
+    """
+    Sink that appends one id attribute of every row to a file, one JSON value per line, so the ids of a table
+    (e.g. the review ids that review likes refer to) survive an interrupted run. Resumes like CsvTableWriter.
+    """
+
+    resumable = True
+
+    def __init__(self, path, attribute, resume=None):
+        self.path = path
+        self.attribute = attribute
+        if resume is not None:
+            with open(path, 'r+b') as file:
+                file.truncate(resume)
+            self.file = open(path, 'a')
+        else:
+            self.file = open(path, 'w')
+
+    def write(self, objects):
+        self.file.writelines(f'{json.dumps(getattr(obj, self.attribute))}\n' for obj in objects)
+
+    def write_batch(self, batch):
+        self.file.writelines(f'{json.dumps(value)}\n' for value in batch.values(self.attribute))
+
+    def sync(self):
+        self.file.flush()
+        return os.path.getsize(self.path)
+
+    def close(self):
+        self.file.close()
+
+
+def read_ids(path):
+    """Read back the ids written by an IdLog."""
+    with open(path) as file:
+        return [json.loads(line) for line in file]
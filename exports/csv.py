@@ -1,9 +1,27 @@
 import csv
+import glob
+import gzip
+import io
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import attrgetter
 
+import numpy as np
 from sqlalchemy import inspect
 
-from constants import OutputDir
+from constants import OutputDir, CsvCompression, CsvPartRows, ExportWorkers
+from generators.columnar import python_values
+from generators.rows import TABLE_COLUMNS
+
+try:
+    import zstandard
+except ImportError:  # zstandard is only needed for CsvCompression = "zstd"
+    zstandard = None
+
+# File name suffix of each CsvCompression option
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
 
 
 def save_to_csv(filename, fieldnames, data):
@@ -26,6 +44,48 @@ def save_to_csv(filename, fieldnames, data):
 
 
 
+@lru_cache(maxsize=None)
+def column_keys(model):
+    """
+    Column attribute names of a mapped class, resolved through SQLAlchemy's reflection once per class
+    (the fields of a generators.rows row type).
+    """
+    if hasattr(model, '_fields'):
+        return model._fields
+    return tuple(column.key for column in inspect(model).column_attrs)
+
+
+def row_getter(columns):
+    """
+    Build a function returning the given attributes of an object as a tuple (also for a single column).
+    """
+    getter = attrgetter(*columns)
+    return getter if len(columns) > 1 else lambda obj: (getter(obj),)
+
+
+def chunk_rows(objects, getter):
+    """
+    The rows of a chunk as tuples in TABLE_COLUMNS order. Rows from generators.rows already are; the column values
+    of ORM objects are read with getter (see row_getter).
+    """
+    if objects and isinstance(objects[0], tuple):
+        return objects
+    return list(map(getter, objects))
+
+
+def csv_values(values, nulls=None):
+    """
+    A ColumnBatch column as the values csv.writer writes (see generators.columnar.python_values). Timestamps of whole
+    seconds are formatted like str(datetime) without building a datetime per value.
+    """
+    if isinstance(values, np.ndarray) and values.dtype == np.dtype('datetime64[s]'):
+        text = np.datetime_as_string(values, unit='s').astype('S19')
+        # "YYYY-MM-DDTHH:MM:SS" -> "YYYY-MM-DD HH:MM:SS"
+        text.view(np.uint8).reshape(-1, 19)[:, 10] = ord(' ')
+        values = text
+    return python_values(values, nulls)
+
+
 def convert_objects_to_dict(objects):
     """
     Convert SQLAlchemy objects to a list of dictionaries for CSV export, using SQLAlchemy's reflection
@@ -33,24 +93,217 @@ def convert_objects_to_dict(objects):
     """
     result = []
     for obj in objects:
-        # Using the SQLAlchemy inspector to get the column attributes and their values
-        obj_dict = {column.key: getattr(obj, column.key) for column in inspect(obj).mapper.column_attrs}
-        result.append(obj_dict)
+        keys = column_keys(type(obj))
+        result.append({key: getattr(obj, key) for key in keys})
     return result
 
 
-def export_csvs(users, listeners, artists, records, singles, albums, songs, sessions, reviews, review_likes):
+def open_text(path, compression=None, mode='w'):
+    """
+    Open a text file for CSV writing (mode "w"), appending (mode "a") or reading (mode "r"), optionally through a
+    streaming gzip or zstd compressor. Appending to a compressed file starts a new gzip member / zstd frame.
+    """
+    if compression is None:
+        return open(path, mode=mode, newline='', buffering=1 << 20)
+    if compression == "gzip":
+        return gzip.open(path, mode=f'{mode}t', newline='', compresslevel=6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError('zstandard is required for CsvCompression = "zstd"')
+        if mode == 'r':
+            # Read every frame, including those appended by resumed runs
+            reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+            return io.TextIOWrapper(reader, newline='')
+        return zstandard.open(path, mode=f'{mode}t', newline='')
+    raise ValueError(f"Unknown CsvCompression: {compression}")
+
+
+def csv_paths(table_name, output_dir=OutputDir, compression=CsvCompression):
+    """
+    Paths of the CSV file(s) written for a table: either <table>.csv or its numbered part files, in order.
+    """
+    suffix = COMPRESSION_SUFFIXES[compression]
+    single = os.path.join(output_dir, f'{table_name}.csv{suffix}')
+    if os.path.exists(single):
+        return [single]
+    return sorted(glob.glob(os.path.join(output_dir, f'{table_name}.part-*.csv{suffix}')))
+
+
+def read_csv(table_name, columns, output_dir=OutputDir, compression=CsvCompression):
     """
-    Export all lists of SQLAlchemy objects to CSV files.
+    Yield the given columns of every row in the CSV file(s) of a table (see csv_paths) as tuples of strings.
     """
-    # Export each table to CSV
-    save_to_csv('Users.csv', ['user_id', 'email', 'joined_date', 'nickname', 'street', 'city', 'state', 'zip', 'genres'], convert_objects_to_dict(users))
-    save_to_csv('Listeners.csv', ['user_id', 'subscription', 'first_name', 'last_name'], convert_objects_to_dict(listeners))
-    save_to_csv('Artists.csv', ['user_id', 'bio', 'stagename'], convert_objects_to_dict(artists))
-    save_to_csv('Records.csv', ['record_id', 'artist_user_id', 'title', 'release_date', 'genre'], convert_objects_to_dict(records))
-    save_to_csv('Singles.csv', ['record_id', 'video_url'], convert_objects_to_dict(singles))
-    save_to_csv('Albums.csv', ['record_id', 'description'], convert_objects_to_dict(albums))
-    save_to_csv('Songs.csv', ['record_id', 'track_number', 'title', 'length', 'bpm', 'mood'], convert_objects_to_dict(songs))
-    save_to_csv('Sessions.csv', ['session_id', 'user_id', 'record_id', 'track_number', 'initiate_at', 'leave_at', 'music_quality', 'device', 'remaining_time', 'replay_count'], convert_objects_to_dict(sessions))
-    save_to_csv('Reviews.csv', ['review_id', 'user_id', 'record_id', 'rating', 'body', 'posted_at'], convert_objects_to_dict(reviews))
-    save_to_csv('ReviewLikes.csv', ['user_id', 'review_id'], convert_objects_to_dict(review_likes))
+    for path in csv_paths(table_name, output_dir, compression):
+        with open_text(path, compression, mode='r') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                continue
+            positions = [header.index(column) for column in columns]
+            for row in reader:
+                yield tuple([row[position] for position in positions])
+
+
+class CsvTableWriter:
+    """
+    Stream one table into <output_dir>/<table>.csv chunk by chunk, so only the current chunk
+    has to be in memory. Rows (generators.rows tuples) go straight into a buffered csv.writer; column values
+    of ORM objects are read with one attrgetter per table instead of building a dict per row.
+
+    Files can be compressed (gzip or zstd) and split into numbered part files of at most part_rows rows,
+    each with its own header (<table>.part-0001.csv.gz, ...). Given an executor, chunks are written on a
+    worker thread while the caller produces the next one, and close() returns without waiting, so
+    several tables are written concurrently; shut the executor down to wait for them.
+
+    sync() returns the position reached so far (files and the size of the last one); a writer created with
+    resume=position truncates the files back to it and appends from there.
+    """
+
+    resumable = True
+
+    def __init__(self, table_name, output_dir=OutputDir, compression=CsvCompression, part_rows=CsvPartRows,
+                 executor=None, resume=None):
+        os.makedirs(output_dir, exist_ok=True)  # Ensure the output directory exists
+        self.table_name = table_name
+        self.output_dir = output_dir
+        self.compression = compression
+        self.part_rows = part_rows
+        self.executor = executor
+        self.getter = row_getter(TABLE_COLUMNS[table_name])
+        self.filenames = []
+        self.file = None
+        self.rows_left = 0
+        self.pending = None
+        # Time spent turning objects into rows (caller's thread) and writing them (writer thread)
+        self.convert_seconds = 0.0
+        self.write_seconds = 0.0
+        self.rows = 0
+        # Files of the table left by an earlier run (another compression or CsvPartRows, more parts) would be read
+        # along with this one's (see csv_paths)
+        self._remove_stale_files(resume['files'] if resume is not None else [])
+        if resume is not None and resume['files']:
+            self._reopen(resume)
+        elif not part_rows:
+            self._open_next()
+
+    def _remove_stale_files(self, keep):
+        for suffix in COMPRESSION_SUFFIXES.values():
+            for pattern in (f'{self.table_name}.csv{suffix}', f'{self.table_name}.part-*.csv{suffix}'):
+                for path in glob.glob(os.path.join(self.output_dir, pattern)):
+                    if os.path.basename(path) not in keep:
+                        os.remove(path)
+
+    def _open_next(self):
+        if self.file is not None:
+            self.file.close()
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        if self.part_rows:
+            filename = f'{self.table_name}.part-{len(self.filenames) + 1:04d}.csv{suffix}'
+        else:
+            filename = f'{self.table_name}.csv{suffix}'
+        self.filenames.append(filename)
+        self.file = open_text(os.path.join(self.output_dir, filename), self.compression)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(TABLE_COLUMNS[self.table_name])
+        self.rows_left = self.part_rows or float('inf')
+
+    def _reopen(self, position):
+        # Drop whatever was written after the position, then keep appending to the last file
+        self.filenames = list(position['files'])
+        path = os.path.join(self.output_dir, self.filenames[-1])
+        with open(path, 'r+b') as file:
+            file.truncate(position['size'])
+        self.file = open_text(path, self.compression, mode='a')
+        self.writer = csv.writer(self.file)
+        self.rows_left = position['rows_left'] if self.part_rows else float('inf')
+
+    def _position(self):
+        if self.file is None:
+            return {'files': [], 'size': 0, 'rows_left': 0}
+        path = os.path.join(self.output_dir, self.filenames[-1])
+        if self.compression is None:
+            self.file.flush()
+        else:
+            # Finish the compressed stream so the file is valid up to here, and continue in a new member/frame
+            self.file.close()
+            self.file = open_text(path, self.compression, mode='a')
+            self.writer = csv.writer(self.file)
+        rows_left = self.rows_left if self.part_rows else None
+        return {'files': list(self.filenames), 'size': os.path.getsize(path), 'rows_left': rows_left}
+
+    @property
+    def seconds(self):
+        return self.convert_seconds + self.write_seconds
+
+    def _write_rows(self, rows):
+        started = time.perf_counter()
+        start = 0
+        while start < len(rows):
+            if self.rows_left == 0:
+                self._open_next()
+            stop = start + min(self.rows_left, len(rows) - start)
+            self.writer.writerows(rows[start:stop])
+            self.rows_left -= stop - start
+            start = stop
+        self.rows += len(rows)
+        self.write_seconds += time.perf_counter() - started
+
+    def _close(self):
+        if self.file is None:
+            self._open_next()  # An empty table still gets a file with a header
+        self.file.close()
+        parts = f" ({len(self.filenames)} parts)" if self.part_rows else ""
+        print(f"Saved {self.table_name}{parts} to {self.output_dir}")
+
+    def _submit(self, function, *args):
+        if self.executor is None:
+            return function(*args)
+        # Keep this table's writes in order while they overlap with the caller
+        if self.pending is not None:
+            self.pending.result()
+        self.pending = self.executor.submit(function, *args)
+        return self.pending
+
+    def write(self, objects):
+        start = time.perf_counter()
+        rows = chunk_rows(objects, self.getter)
+        self.convert_seconds += time.perf_counter() - start
+        self._submit(self._write_rows, rows)
+
+    def write_batch(self, batch):
+        # ColumnBatch columns are already in TABLE_COLUMNS order
+        start = time.perf_counter()
+        rows = list(zip(*[csv_values(values, batch.nulls.get(name)) for name, values in batch.columns.items()]))
+        self.convert_seconds += time.perf_counter() - start
+        self._submit(self._write_rows, rows)
+
+    def sync(self):
+        """Wait until everything written so far is on disk and return the position to resume from."""
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+        return self._position()
+
+    def close(self):
+        return self._submit(self._close)
+
+
+def export_csvs(users, listeners, artists, records, singles, albums, songs, sessions, reviews, review_likes,
+                output_dir=OutputDir):
+    """
+    Export all lists of generated rows (or SQLAlchemy objects) to CSV files in output_dir, ExportWorkers tables at a time.
+    """
+    tables = {
+        'Users': users, 'Listeners': listeners, 'Artists': artists, 'Records': records, 'Singles': singles,
+        'Albums': albums, 'Songs': songs, 'Sessions': sessions, 'Reviews': reviews, 'ReviewLikes': review_likes,
+    }
+
+    def export_table(table_name, objects):
+        writer = CsvTableWriter(table_name, output_dir)
+        writer.write(objects)
+        writer.close()
+
+    # Export the tables to CSV concurrently
+    with ThreadPoolExecutor(max_workers=ExportWorkers) as executor:
+        for future in [executor.submit(export_table, name, objects) for name, objects in tables.items()]:
+            future.result()
@@ -0,0 +1,137 @@
+import math
+import os
+import time
+
+from constants import OutputDir, SqlDumpMode, SqlInsertRows, CsvPartRows
+from exports.csv import TABLE_COLUMNS, row_getter, chunk_rows
+from sql.bulk_load import load_data_sql
+from sql.ddl import create_table_sql, deferred_keys_sql
+
+# Characters escaped in MySQL string literals (with the server's default backslash escapes)
+_ESCAPES = str.maketrans({'\\': '\\\\', "'": "\\'", '\n': '\\n', '\r': '\\r', '\0': '\\0', '\x1a': '\\Z'})
+
+LOAD_SCRIPT_NAME = 'load.sql'
+
+
+def _quote(value):
+    return f"'{str(value).translate(_ESCAPES)}'"
+
+
+# How values are rendered by type; anything else (dates, timestamps) is quoted in its ISO format
+_LITERALS = {type(None): lambda value: 'NULL', int: repr, float: repr, str: _quote}
+
+
+def sql_literal(value):
+    """Render a value as a MySQL literal: NULL, a number or a quoted string."""
+    return _LITERALS.get(type(value), _quote)(value)
+
+
+class SqlDumpWriter:
+    """
+    Stream one table into <output_dir>/<table>.sql, a MySQL script that recreates and fills the table.
+    The table is created with its primary key only and the rows are loaded with foreign key and unique checks off,
+    either as extended INSERTs of insert_rows rows (mode "insert", one transaction per chunk) or with
+    LOAD DATA LOCAL INFILE from the table's CSV files (mode "infile"). Secondary indexes and foreign keys are
+    added at the end in one ALTER TABLE.
+
+    Resumes like CsvTableWriter: sync() returns the position after the last chunk.
+    """
+
+    resumable = True
+
+    def __init__(self, model, output_dir=OutputDir, mode=SqlDumpMode, insert_rows=SqlInsertRows,
+                 part_rows=CsvPartRows, resume=None):
+        if mode not in ("insert", "infile"):
+            raise ValueError(f"Unknown SqlDumpMode: {mode}")
+        os.makedirs(output_dir, exist_ok=True)
+        self.table = model.__table__
+        self.output_dir = output_dir
+        self.mode = mode
+        self.insert_rows = insert_rows
+        self.part_rows = part_rows
+        self.columns = TABLE_COLUMNS[self.table.name]
+        self.getter = row_getter(self.columns)
+        self.insert = f"INSERT INTO `{self.table.name}` ({', '.join(f'`{column}`' for column in self.columns)}) VALUES\n"
+        self.filename = f'{self.table.name}.sql'
+        self.path = os.path.join(output_dir, self.filename)
+        self.rows = 0
+        self.seconds = 0.0
+        if resume is not None:
+            # Drop whatever was written after the position and keep appending
+            with open(self.path, 'r+b') as file:
+                file.truncate(resume['size'])
+            self.file = open(self.path, 'a', encoding='utf-8')
+            self.rows = resume['rows']
+        else:
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self.file.write(
+                f"-- {self.table.name} of the Zot Music dataset; replay with the mysql client "
+                f"(or all tables at once with {LOAD_SCRIPT_NAME})\n"
+                "SET NAMES utf8mb4;\n"
+                "SET @OLD_FOREIGN_KEY_CHECKS = @@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS = 0;\n"
+                "SET @OLD_UNIQUE_CHECKS = @@UNIQUE_CHECKS, UNIQUE_CHECKS = 0;\n"
+                "SET @OLD_AUTOCOMMIT = @@AUTOCOMMIT, AUTOCOMMIT = 0;\n"
+                f"DROP TABLE IF EXISTS `{self.table.name}`;\n"
+                f"{create_table_sql(self.table)};\n"
+            )
+
+    def _write_rows(self, rows):
+        start = time.perf_counter()
+        if self.mode == "insert":
+            statements = []
+            for offset in range(0, len(rows), self.insert_rows):
+                values = ',\n'.join(f"({','.join([sql_literal(value) for value in row])})"
+                                    for row in rows[offset:offset + self.insert_rows])
+                statements.append(f"{self.insert}{values};\n")
+            statements.append("COMMIT;\n")
+            self.file.write(''.join(statements))
+        # In "infile" mode the rows are loaded from the CSVs, which are written by the CSV sink
+        self.rows += len(rows)
+        self.seconds += time.perf_counter() - start
+
+    def write(self, objects):
+        self._write_rows(chunk_rows(objects, self.getter))
+
+    def write_batch(self, batch):
+        self._write_rows(list(batch.rows()))
+
+    def sync(self):
+        self.file.flush()
+        return {'size': os.path.getsize(self.path), 'rows': self.rows}
+
+    def _csv_filenames(self):
+        # The names CsvTableWriter gives the table's files (an empty table still gets one)
+        if not self.part_rows:
+            return [f'{self.table.name}.csv']
+        parts = max(1, math.ceil(self.rows / self.part_rows))
+        return [f'{self.table.name}.part-{part:04d}.csv' for part in range(1, parts + 1)]
+
+    def close(self):
+        start = time.perf_counter()
+        statements = []
+        if self.mode == "infile":
+            statements.extend(f"{load_data_sql(self.table, filename, self.columns)};\n"
+                              for filename in self._csv_filenames())
+            statements.append("COMMIT;\n")
+        statements.extend(f"{statement};\n" for statement in deferred_keys_sql(self.table))
+        statements.append(
+            "SET FOREIGN_KEY_CHECKS = @OLD_FOREIGN_KEY_CHECKS;\n"
+            "SET UNIQUE_CHECKS = @OLD_UNIQUE_CHECKS;\n"
+            "SET AUTOCOMMIT = @OLD_AUTOCOMMIT;\n"
+        )
+        self.file.write(''.join(statements))
+        self.file.close()
+        self.seconds += time.perf_counter() - start
+        print(f"Saved {self.filename} to {self.output_dir}")
+
+
+def write_load_script(table_names, output_dir=OutputDir):
+    """
+    Write <output_dir>/load.sql, which replays the scripts of all tables in the given (foreign key) order.
+    Run it from the output directory: mysql --local-infile=1 <database> < load.sql
+    """
+    path = os.path.join(output_dir, LOAD_SCRIPT_NAME)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f"-- Load the Zot Music dataset: cd into this directory, then mysql --local-infile=1 <database> < {LOAD_SCRIPT_NAME}\n")
+        file.writelines(f"SOURCE {table_name}.sql;\n" for table_name in table_names)
+    print(f"Saved {LOAD_SCRIPT_NAME} to {output_dir}")
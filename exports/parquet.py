@@ -0,0 +1,134 @@
+import os
+import time
+
+import numpy as np
+from sqlalchemy import Date, Integer, TIMESTAMP
+
+from constants import OutputDir, RowGroupSize
+from exports.csv import TABLE_COLUMNS, row_getter, chunk_rows
+from generators.columnar import python_values
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the "parquet" and "arrow" target formats
+    pa = None
+    pq = None
+
+FILE_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+
+
+def arrow_type(column):
+    """
+    Map a SQLAlchemy column type to the Arrow type it is exported as. Every Arrow column is nullable.
+    """
+    if isinstance(column.type, TIMESTAMP):
+        return pa.timestamp('us')
+    if isinstance(column.type, Date):
+        return pa.date32()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    return pa.string()
+
+
+def arrow_schema(model):
+    """
+    Build the Arrow schema of a mapped class, with the columns in TABLE_COLUMNS order.
+    """
+    table = model.__table__
+    return pa.schema([
+        pa.field(name, arrow_type(table.columns[name]), nullable=table.columns[name].nullable)
+        for name in TABLE_COLUMNS[table.name]
+    ])
+
+
+def arrow_array(values, arrow_type, nulls=None):
+    """
+    One column of a chunk (a list of Python values, or a NumPy array of a ColumnBatch with the mask of its nulls)
+    as an Arrow array of the given type.
+    """
+    if not isinstance(values, np.ndarray) or values.dtype == object:
+        return pa.array(python_values(values, nulls), type=arrow_type)
+    if values.dtype.kind == 'S':
+        # Ids of fixed-width ASCII bytes
+        return pa.array(values, mask=nulls, type=pa.binary(values.dtype.itemsize)).cast(arrow_type)
+    return pa.array(values, mask=nulls).cast(arrow_type)
+
+
+class ArrowTableWriter:
+    """
+    Stream one table into <output_dir>/<table>.parquet (or .arrow for Arrow IPC) with typed columns.
+    Every chunk is converted to one Arrow array per column, and the buffered arrays are flushed as one row group
+    (record batch) every RowGroupSize rows.
+    The footer is only written on close, so an interrupted file can't be resumed and is rewritten instead.
+    """
+
+    resumable = False
+
+    def __init__(self, model, target_format="parquet", row_group_size=RowGroupSize, output_dir=OutputDir):
+        if pa is None:
+            raise ImportError(f'pyarrow is required for TargetFormat = "{target_format}"')
+        if target_format not in FILE_EXTENSIONS:
+            raise ValueError(f"Unknown Arrow target format: {target_format}")
+
+        os.makedirs(output_dir, exist_ok=True)  # Ensure the output directory exists
+        self.output_dir = output_dir
+        self.schema = arrow_schema(model)
+        self.row_group_size = row_group_size
+        self.filename = f'{model.__tablename__}.{FILE_EXTENSIONS[target_format]}'
+        path = os.path.join(output_dir, self.filename)
+        if target_format == "parquet":
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+        self.buffers = {field.name: [pa.array([], type=field.type)] for field in self.schema}
+        self.getter = row_getter(self.schema.names)
+        self.rows = 0
+        self.seconds = 0.0
+
+    def write(self, objects):
+        start = time.perf_counter()
+        rows = chunk_rows(objects, self.getter)
+        columns = list(zip(*rows)) or [()] * len(self.schema)
+        for field, values in zip(self.schema, columns):
+            self.buffers[field.name].append(pa.array(values, type=field.type))
+        self._flush()
+        self.rows += len(rows)
+        self.seconds += time.perf_counter() - start
+
+    def write_batch(self, batch):
+        start = time.perf_counter()
+        for field in self.schema:
+            self.buffers[field.name].append(
+                arrow_array(batch.columns[field.name], field.type, batch.nulls.get(field.name)))
+        self._flush()
+        self.rows += len(batch)
+        self.seconds += time.perf_counter() - start
+
+    def _flush(self, final=False):
+        """Write every complete row group in the buffers (and the remainder if final)."""
+        buffered = sum(len(array) for array in self.buffers[self.schema.names[0]])
+        if buffered < self.row_group_size and not final:
+            return
+        columns = [pa.concat_arrays(self.buffers[field.name]) for field in self.schema]
+        start = 0
+        while buffered - start >= self.row_group_size or (final and start < buffered):
+            stop = min(start + self.row_group_size, buffered)
+            record_batch = pa.record_batch([column.slice(start, stop - start) for column in columns],
+                                           schema=self.schema)
+            if isinstance(self.writer, pq.ParquetWriter):
+                self.writer.write_table(pa.Table.from_batches([record_batch]))
+            else:
+                self.writer.write_batch(record_batch)
+            start = stop
+        self.buffers = {field.name: [column.slice(start)] for field, column in zip(self.schema, columns)}
+
+    def sync(self):
+        return None
+
+    def close(self):
+        start = time.perf_counter()
+        self._flush(final=True)
+        self.writer.close()
+        self.seconds += time.perf_counter() - start
+        print(f"Saved {self.filename} to {self.output_dir}")
@@ -0,0 +1,75 @@
+import numpy as np
+
+from constants import NullValueProbability
+
+
+class ColumnBatch:
+    """
+    A chunk of rows of one table stored column by column instead of as one row object per row.
+    Columns are keyed by column name, in the table's export column order, and are plain Python lists or NumPy
+    arrays (numbers, datetime64, fixed-width bytes or objects). nulls maps a column given as an array to the mask of
+    its null values. The arrays are only turned into Python values by the sinks that need them (see values()).
+    """
+
+    def __init__(self, table_name, columns, nulls=None):
+        self.table_name = table_name
+        self.columns = columns
+        self.nulls = nulls or {}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def values(self, name):
+        """The values of one column as a list of Python values (None for nulls)."""
+        return python_values(self.columns[name], self.nulls.get(name))
+
+    def rows(self):
+        """Iterate over the rows as tuples of Python values in column order."""
+        return zip(*[self.values(name) for name in self.columns])
+
+    def dicts(self):
+        """Return the rows as a list of {column: value} dictionaries."""
+        names = list(self.columns)
+        return [dict(zip(names, row)) for row in self.rows()]
+
+    def slices(self, size):
+        """Split the batch into batches of at most size rows (one batch, possibly empty, if it is small enough)."""
+        if len(self) <= size:
+            yield self
+            return
+        for start in range(0, len(self), size):
+            yield ColumnBatch(self.table_name,
+                              {name: values[start:start + size] for name, values in self.columns.items()},
+                              {name: mask[start:start + size] for name, mask in self.nulls.items()})
+
+
+def python_values(values, nulls=None):
+    """
+    A column (list or NumPy array) as a list of Python values: datetime64 becomes datetime, fixed-width bytes
+    become str, and the values where the mask nulls is set become None.
+    """
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind == 'M':
+            values = values.astype('datetime64[us]').astype(object)
+        elif values.dtype.kind == 'S':
+            values = values.astype(f'U{values.dtype.itemsize}')
+        values = values.tolist()
+    if nulls is not None:
+        values = list(values)
+        for index in np.flatnonzero(nulls).tolist():
+            values[index] = None
+    return values
+
+
+def with_nulls(values, rng, probability=NullValueProbability):
+    """values as a list, each replaced by None with the given probability (drawn from the NumPy generator rng)."""
+    values = np.asarray(values, dtype=object)
+    values[rng.random(len(values)) < probability] = None
+    return values.tolist()
+
+
+def column_values(table, name):
+    """The values of one column of a table given as a list of rows or as a ColumnBatch."""
+    if isinstance(table, ColumnBatch):
+        return table.values(name)
+    return [getattr(row, name) for row in table]
@@ -0,0 +1,162 @@
+import hashlib
+
+import numpy as np
+
+from constants import IdStrategy, Seed
+
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+# Crockford's base32 alphabet, lower case (no i, l, o, u)
+BASE32_DIGITS = '0123456789abcdefghjkmnpqrstvwxyz'
+
+# Next counter value of every prefix (the "uuid" ids without a NumPy generator are derived from it, too)
+_counters = {}
+# Seed the counter-based "uuid" ids are derived from
+_uuid_seed = Seed
+
+
+def set_uuid_seed(seed: int):
+    """Derive the counter-based "uuid" ids from seed from now on (see generators.seeds.reseed)."""
+    global _uuid_seed
+    _uuid_seed = seed
+
+
+def reserve_ids(prefix: str, count: int) -> int:
+    """
+    Reserve count consecutive counter values for a prefix and return the first one (counters start at 1).
+    """
+    start = _counters.get(prefix, 1)
+    _counters[prefix] = start + count
+    return start
+
+
+def next_id(prefix: str) -> int:
+    """
+    Return the next counter value of a prefix without reserving it.
+    """
+    return _counters.get(prefix, 1)
+
+
+def set_id_counter(prefix: str, start: int):
+    """
+    Make the next counter id of a prefix start at the given value, e.g. at the offset of a shard.
+    """
+    _counters[prefix] = start
+
+
+def to_base32(number: int) -> str:
+    digits = []
+    while True:
+        number, remainder = divmod(number, 32)
+        digits.append(BASE32_DIGITS[remainder])
+        if number == 0:
+            return ''.join(reversed(digits))
+
+
+def from_base32(text: str) -> int:
+    number = 0
+    for digit in text:
+        number = number * 32 + BASE32_DIGITS.index(digit)
+    return number
+
+
+def id_counter(prefix: str, value) -> int:
+    """
+    The counter value an "int" or "base32" id of a prefix was made from (the inverse of generate_ids).
+    """
+    if IdStrategy == "int":
+        return int(value)
+    if IdStrategy == "base32":
+        return from_base32(value[len(prefix) + 1:])
+    raise ValueError(f"{IdStrategy} ids have no counter")
+
+
+def seeded_uuid_ids(rng: np.random.Generator, prefix: str, count: int) -> list:
+    """
+    "<prefix>_<uuid4>" strings whose random bits come from a NumPy generator, formatted without a Python-level loop.
+    """
+    uuids = seeded_uuid_array(rng, prefix, count)
+    return uuids.astype(f'U{uuids.dtype.itemsize}').tolist()
+
+
+def seeded_uuid_array(rng: np.random.Generator, prefix: str, count: int) -> np.ndarray:
+    """The ids of seeded_uuid_ids as an array of fixed-width ASCII bytes."""
+    return format_uuids(rng.integers(0, 256, size=(count, 16), dtype=np.uint8), prefix)
+
+
+def counter_uuid_array(prefix: str, start: int, count: int) -> np.ndarray:
+    """
+    "<prefix>_<uuid4>" ids of the counter values start, start + 1, ... as fixed-width ASCII bytes. Their random bits
+    are a hash (splitmix64) of the counter value keyed by the seed (see set_uuid_seed) and the prefix, so an id only
+    depends on its counter value, not on how many ids are generated at once.
+    """
+    digest = hashlib.sha256(f'{_uuid_seed}:uuid:{prefix}'.encode()).digest()
+    key = np.uint64(int.from_bytes(digest[:8], 'big'))
+    counters = np.arange(start, start + count, dtype=np.uint64)
+    words = np.stack([counters * np.uint64(2), counters * np.uint64(2) + np.uint64(1)], axis=1)
+    z = key + words * np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return format_uuids(z.view(np.uint8).reshape(count, 16), prefix)
+
+
+def format_uuids(raw: np.ndarray, prefix: str) -> np.ndarray:
+    """Format the rows of 16 random bytes in raw as "<prefix>_<uuid4>" ids of fixed-width ASCII bytes."""
+    count = len(raw)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    digits = HEX_DIGITS[np.stack([raw >> 4, raw & 0x0F], axis=2).reshape(count, 32)]
+
+    prefix_bytes = f'{prefix}_'.encode()
+    width = len(prefix_bytes) + 36
+    out = np.empty((count, width), dtype=np.uint8)
+    out[:, :len(prefix_bytes)] = np.frombuffer(prefix_bytes, dtype=np.uint8)
+    position = len(prefix_bytes)
+    for start, stop in ((0, 8), (8, 12), (12, 16), (16, 20), (20, 32)):
+        out[:, position:position + stop - start] = digits[:, start:stop]
+        position += stop - start
+        if stop != 32:
+            out[:, position] = ord('-')
+            position += 1
+    return out.view(f'S{width}').ravel()
+
+
+def generate_ids(prefix: str, count: int, rng: np.random.Generator = None) -> list:
+    """
+    Generate count unique ids for one entity with the configured IdStrategy:
+      "uuid"   - "<prefix>_<uuid4>", random bits hashed from the seed and a counter per prefix (see
+                 counter_uuid_array), or drawn from rng when given
+      "int"    - monotonic integers 1, 2, 3, ... per prefix
+      "base32" - "<prefix>_<counter in base32>", e.g. "session_1z"
+    Every strategy reproduces the same ids for the same Seed.
+    """
+    if IdStrategy == "uuid":
+        if rng is not None:
+            return seeded_uuid_ids(rng, prefix, count)
+        uuids = counter_uuid_array(prefix, reserve_ids(prefix, count), count)
+        return uuids.astype(f'U{uuids.dtype.itemsize}').tolist()
+    if IdStrategy == "int":
+        start = reserve_ids(prefix, count)
+        return list(range(start, start + count))
+    if IdStrategy == "base32":
+        start = reserve_ids(prefix, count)
+        return [f"{prefix}_{to_base32(number)}" for number in range(start, start + count)]
+    raise ValueError(f"Unknown IdStrategy: {IdStrategy}")
+
+
+def generate_id_array(prefix: str, count: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    The ids of generate_ids(prefix, count, rng) as a NumPy array, for a ColumnBatch: fixed-width ASCII bytes for
+    "uuid", int64 for "int" and Python strings for "base32".
+    """
+    if IdStrategy == "uuid":
+        return seeded_uuid_array(rng, prefix, count)
+    if IdStrategy == "int":
+        start = reserve_ids(prefix, count)
+        return np.arange(start, start + count, dtype=np.int64)
+    return np.array(generate_ids(prefix, count, rng), dtype=object)
+
+
+def generate_unique_id(prefix: str):
+    """Generate a unique ID with a given prefix."""
+    return generate_ids(prefix, 1)[0]
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+
+from generators.columnar import column_values
+
+# The arrays of a ParentKeys, each saved as <name>.npy
+KEY_ARRAYS = ('listener_ids', 'record_ids', 'record_artist_idx', 'song_record_idx', 'song_track_numbers',
+              'song_lengths')
+
+
+def fixed_width(values):
+    """
+    An array as a fixed-width array that can be saved and memory-mapped: integer ids as int64, string ids as ASCII
+    bytes as wide as the longest one (one byte per character; see key_at). Numeric arrays are returned unchanged.
+    """
+    if values.dtype != object:
+        return values
+    if len(values) and isinstance(values[0], int):
+        return values.astype(np.int64)
+    return np.asarray(values.tolist(), dtype=bytes)
+
+
+class ParentKeys:
+    """
+    The parents that sessions, reviews and review likes refer to, as columns indexed by a dense integer per entity:
+    listener i, record k, song j. References between them are integer arrays (song j belongs to record
+    song_record_idx[j], record k to artist record_artist_idx[k]), and the generators pick parents by index.
+    External ids are looked up from listener_ids / record_ids only when a row is built, so the parent rows
+    themselves don't have to be kept.
+
+    Artists are numbered in sorted id order. Keys built from songs without their records number the records
+    in the order the songs refer to them.
+
+    save() writes the arrays to a directory and load() memory-maps them, so other processes and later runs can reuse
+    them; loaded keys are pickled as their directory. The generators only read the elements they pick (key_at,
+    listener_ids_at, song_record_ids), so mapped keys are never copied into memory as a whole.
+    """
+
+    def __init__(self, listener_ids, record_ids, record_artist_idx, song_record_idx, song_track_numbers, song_lengths):
+        self.listener_ids = listener_ids
+        self.record_ids = record_ids
+        self.record_artist_idx = record_artist_idx
+        self.song_record_idx = song_record_idx
+        self.song_track_numbers = song_track_numbers
+        self.song_lengths = song_lengths
+        # Where the arrays are memory-mapped from (None if they are in memory)
+        self.directory = None
+
+    @classmethod
+    def from_rows(cls, listeners=(), records=(), songs=()):
+        """
+        Build the keys from generated parent rows (lists of generators.rows rows or ColumnBatches);
+        parts that aren't needed can be left out.
+        """
+        song_record_ids = column_values(songs, 'record_id')
+        if len(records):
+            record_ids = column_values(records, 'record_id')
+        else:
+            record_ids = list(dict.fromkeys(song_record_ids))
+        record_artist_ids = column_values(records, 'artist_user_id')
+        record_index = {record_id: k for k, record_id in enumerate(record_ids)}
+        artist_index = {artist_id: a for a, artist_id in enumerate(sorted(set(record_artist_ids)))}
+        return cls(
+            listener_ids=np.array(column_values(listeners, 'user_id'), dtype=object),
+            record_ids=np.array(record_ids, dtype=object),
+            record_artist_idx=np.array([artist_index[artist_id] for artist_id in record_artist_ids], dtype=np.int32),
+            song_record_idx=np.array([record_index[record_id] for record_id in song_record_ids], dtype=np.int32),
+            song_track_numbers=np.array(column_values(songs, 'track_number'), dtype=np.int32),
+            song_lengths=np.array(column_values(songs, 'length'), dtype=np.int32),
+        )
+
+    def save(self, directory):
+        """Write every array to <directory>/<name>.npy as a fixed-width array (see fixed_width)."""
+        os.makedirs(directory, exist_ok=True)
+        for name in KEY_ARRAYS:
+            path = os.path.join(directory, f'{name}.npy')
+            # Write to a temporary file first so processes mapping the old file never see a partial one
+            with open(f'{path}.tmp', 'wb') as file:
+                np.save(file, fixed_width(getattr(self, name)), allow_pickle=False)
+            os.replace(f'{path}.tmp', path)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Memory-map keys written by save() (mmap_mode=None reads them into memory instead)."""
+        keys = cls(**{name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+                      for name in KEY_ARRAYS})
+        if mmap_mode is not None:
+            keys.directory = directory
+        return keys
+
+    def __reduce__(self):
+        # Worker processes map the same files instead of receiving a copy of the arrays
+        if self.directory is not None:
+            return ParentKeys.load, (self.directory,)
+        return ParentKeys, tuple(getattr(self, name) for name in KEY_ARRAYS)
+
+    @property
+    def listener_count(self):
+        return len(self.listener_ids)
+
+    @property
+    def song_count(self):
+        return len(self.song_lengths)
+
+    @property
+    def artist_count(self):
+        return int(self.record_artist_idx.max()) + 1 if len(self.record_artist_idx) else 0
+
+    def listener_ids_at(self, listener_idx):
+        """
+        The ids of the listeners at an array of indexes, as an array (a ColumnBatch column; saved string ids are
+        ASCII bytes, which the sinks decode).
+        """
+        return self.listener_ids[listener_idx]
+
+    def song_record_ids(self, song_idx):
+        """The record ids of the songs at an array of indexes, as an array (a ColumnBatch column)."""
+        return self.record_ids[self.song_record_idx[song_idx]]
+
+
+def key_at(array, index):
+    """One element of a key array (in memory or memory-mapped) as a plain Python value (saved string ids as str)."""
+    value = array[index]
+    if isinstance(value, np.bytes_):
+        return value.decode('ascii')
+    return value.item() if isinstance(value, np.generic) else value
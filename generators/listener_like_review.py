@@ -1,69 +1,211 @@
-from typing import List
+from typing import Iterator, List
 import random
+import numpy as np
 from faker import Faker
 
 from generators.listener_review_record import create_reviews
 from generators.listener_session_song import create_sessions
 from generators.record_single_album_song import create_records_singles_albums_songs
 from generators.user_artist_listener import create_users_listeners_artists
-from sql.zot_music import ReviewLike, Review, Listener, session
-from constants import NumberOfReviewLikes, MinLikesPerReview, MaxLikesPerReview, Seed
+from generators.columnar import ColumnBatch
+from generators.keys import ParentKeys, key_at
+from generators.seeds import derive_seed
+from generators.rows import ReviewLikeRow, ReviewRow, ListenerRow
+from sql.zot_music import get_session, to_orm
+from constants import NumberOfReviewLikes, MinLikesPerReview, MaxLikesPerReview, Seed, ChunkSize, \
+    ReviewLikeDistribution, ReviewLikeZipfExponent, GeneratorConfig
 
 # Initialize the Faker instance with the seed
 faker = Faker()
 random.seed(Seed)
 Faker.seed(Seed)
 
-def create_review_likes(reviews: List[Review], listeners: List[Listener]) -> List[ReviewLike]:
+def iter_review_likes(review_ids: List[str], keys: ParentKeys, chunk_size: int = ChunkSize,
+                      count: int = NumberOfReviewLikes) -> Iterator[List[ReviewLikeRow]]:
+    """
+    Generate up to count (NumberOfReviewLikes by default) likes and yield them in lists of at most chunk_size.
+    Only the review ids are needed, so callers streaming reviews don't have to keep the review rows;
+    listeners are taken from keys.
+    """
+    listener_count = keys.listener_count
     review_likes = []
+    total = 0
+    if count <= 0:
+        return
 
-    for review in reviews:
+    for review_id in review_ids:
         # Randomly decide how many likes this review gets (between MinLikesPerReview and MaxLikesPerReview)
         num_likes = random.randint(MinLikesPerReview, MaxLikesPerReview)
-        liked_listeners = random.sample(listeners, min(num_likes, len(listeners)))
+        # Sampling indexes picks the same listeners as sampling the ids, without reading all of them
+        liked_listeners = random.sample(range(listener_count), min(num_likes, listener_count))
 
         for listener in liked_listeners:
-            review_like = ReviewLike(
-                user_id=listener.user_id,
-                review_id=review.review_id
+            review_like = ReviewLikeRow(
+                user_id=key_at(keys.listener_ids, listener),
+                review_id=review_id
             )
             review_likes.append(review_like)
+            total += 1
 
             # Stop early if the number of likes exceeds the limit
-            if len(review_likes) >= NumberOfReviewLikes:
-                return review_likes
+            if total >= count:
+                yield review_likes
+                return
 
-    return review_likes
+            if len(review_likes) >= chunk_size:
+                yield review_likes
+                review_likes = []
+
+    if review_likes:
+        yield review_likes
+
+def review_weights(rng: np.random.Generator, review_count: int, distribution: str = ReviewLikeDistribution,
+                   exponent: float = ReviewLikeZipfExponent):
+    """
+    Probability of each review to receive a like: None for uniform, or Zipf popularity (rank ** -exponent)
+    with the popularity ranks shuffled over the reviews, so hot reviews aren't just the first ones.
+    """
+    if distribution == "uniform":
+        return None
+    if distribution == "zipf":
+        weights = np.arange(1, review_count + 1, dtype=np.float64) ** -exponent
+        weights = weights[rng.permutation(review_count)]
+        return weights / weights.sum()
+    raise ValueError(f"Unknown ReviewLikeDistribution: {distribution}")
+
+
+def cap_weights(weights: np.ndarray, count: int, cap: float) -> np.ndarray:
+    """
+    Clip the expected likes of every review (count * weight) to at most cap and hand the excess to the other
+    reviews proportionally, so the hottest reviews don't exhaust their listeners and stall the sampler.
+    """
+    cap = max(cap, count / len(weights))
+    weights = weights.copy()
+    for _ in range(32):
+        over = weights * count > cap
+        if not over.any():
+            break
+        weights[over] = cap / count
+        rest = ~over & (weights * count < cap)
+        weights[rest] *= (1 - weights[~rest].sum()) / weights[rest].sum()
+    return weights / weights.sum()
+
+
+def _drop_known(candidates: np.ndarray, known: List[np.ndarray]) -> np.ndarray:
+    # Remove candidates (sorted, unique) already present in one of the sorted arrays of known pairs
+    for pairs in known:
+        if len(pairs) == 0:
+            continue
+        position = np.minimum(np.searchsorted(pairs, candidates), len(pairs) - 1)
+        candidates = candidates[pairs[position] != candidates]
+    return candidates
+
+
+def sample_review_like_pairs(rng: np.random.Generator, review_count: int, listener_count: int, count: int,
+                             distribution: str = ReviewLikeDistribution) -> np.ndarray:
+    """
+    Draw exactly count distinct (review, listener) index pairs, packed as review_idx * listener_count + listener_idx
+    and returned sorted (grouped by review). Pairs are drawn in vectorized rounds; each round's new pairs are
+    deduplicated as packed int64s against the earlier rounds, so the cost is proportional to the number of likes,
+    not to reviews x listeners.
+    """
+    capacity = review_count * listener_count
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    if count > capacity:
+        raise ValueError(f"Cannot draw {count} unique likes from {review_count} reviews and {listener_count} listeners")
+    if count > capacity // 2:
+        # Nearly every pair is liked: draw the pairs that are *not* liked instead (uniformly)
+        excluded = sample_review_like_pairs(rng, review_count, listener_count, capacity - count, "uniform")
+        return np.setdiff1d(np.arange(capacity, dtype=np.int64), excluded, assume_unique=True)
+
+    weights = review_weights(rng, review_count, distribution)
+    if weights is not None:
+        weights = cap_weights(weights, count, listener_count / 2)
+    known = []
+    found = 0
+    while found < count:
+        # Over-draw a little so that duplicates rarely need another round
+        missing = count - found
+        size = missing + missing // 10 + 16
+        if weights is None:
+            review_idx = rng.integers(0, review_count, size)
+        else:
+            review_idx = rng.choice(review_count, size, p=weights)
+        listener_idx = rng.integers(0, listener_count, size)
+        candidates = _drop_known(np.unique(review_idx * listener_count + listener_idx), known)
+        known.append(candidates)
+        found += len(candidates)
+        # If a skewed round barely finds new pairs, finish uniformly
+        if weights is not None and len(candidates) < missing // 100:
+            weights = None
+
+    pairs = np.concatenate(known)
+    if len(pairs) > count:
+        pairs = rng.choice(pairs, count, replace=False)
+    pairs.sort()
+    return pairs
+
+
+def iter_review_like_batches(review_ids: List[str], keys: ParentKeys, chunk_size: int = ChunkSize,
+                             count: int = NumberOfReviewLikes, seed: int = Seed) -> Iterator[ColumnBatch]:
+    """
+    Sampling counterpart of iter_review_likes: exactly count unique likes spread over all reviews according to
+    ReviewLikeDistribution (MinLikesPerReview/MaxLikesPerReview don't apply), yielded as ColumnBatches.
+    Draws from its own NumPy generator, seeded with derive_seed(seed, 'review_likes').
+    """
+    if count <= 0:
+        return
+    rng = np.random.default_rng(derive_seed(seed, 'review_likes'))
+    review_ids = np.array(review_ids, dtype=object)
+    listener_count = keys.listener_count
+    pairs = sample_review_like_pairs(rng, len(review_ids), listener_count, count)
+
+    for offset in range(0, count, chunk_size):
+        review_idx, listener_idx = np.divmod(pairs[offset:offset + chunk_size], listener_count)
+        yield ColumnBatch('ReviewLikes', {
+            'user_id': keys.listener_ids_at(listener_idx),
+            'review_id': review_ids[review_idx].tolist(),
+        })
+
+def create_review_likes(reviews: List[ReviewRow], listeners: List[ListenerRow],
+                        config: GeneratorConfig = None) -> List[ReviewLikeRow]:
+    count = (config or GeneratorConfig()).review_likes
+    review_ids = [review.review_id for review in reviews]
+    keys = ParentKeys.from_rows(listeners=listeners)
+    return [review_like for chunk in iter_review_likes(review_ids, keys, count=count) for review_like in chunk]
 
 # Adjust the main code to commit review likes
 if __name__ == "__main__":
+    session = get_session()
+
     # Create genres, users, listeners, and artists and insert them into the database
     users, listeners, artists = create_users_listeners_artists()
 
     # Commit genres, users, listeners, and artists first
-    session.add_all(users + artists + listeners)
+    session.add_all(to_orm(users + artists + listeners))
     session.commit()
 
     # Create records, singles, albums, and songs
     records, singles, albums, songs = create_records_singles_albums_songs(artists)
 
     # Commit records, singles, albums, and songs
-    session.add_all(records + singles + albums + songs)
+    session.add_all(to_orm(records + singles + albums + songs))
     session.commit()
 
     # Create sessions and commit them
     sessions = create_sessions(listeners, songs)
-    session.add_all(sessions)
+    session.add_all(to_orm(sessions))
     session.commit()
 
     # Create reviews and commit them
     reviews = create_reviews(listeners, records)
-    session.add_all(reviews)
+    session.add_all(to_orm(reviews))
     session.commit()
 
     # Create review likes and commit them
     review_likes = create_review_likes(reviews, listeners)
-    session.add_all(review_likes)
+    session.add_all(to_orm(review_likes))
     session.commit()
 
     print(f"Created {len(users)} users, {len(listeners)} listeners, {len(artists)} artists, {len(records)} records, "
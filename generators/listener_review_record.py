@@ -1,4 +1,4 @@
-from typing import List
+from typing import Iterator, List
 import random
 from faker import Faker
 from datetime import datetime
@@ -6,9 +6,14 @@ from datetime import datetime
 from generators.listener_session_song import create_sessions
 from generators.record_single_album_song import create_records_singles_albums_songs
 from generators.user_artist_listener import create_users_listeners_artists
-from sql.zot_music import Review, Listener, Record, session
-from constants import NumberOfReviews, MinRating, MaxRating, Seed, generate_unique_id, RecordLatestEndDate, \
-    NullValueProbability
+from generators.ids import generate_ids
+from generators.keys import ParentKeys, key_at
+from generators.popularity import Popularity
+from generators.text_pool import pool_text
+from generators.rows import ReviewRow, ListenerRow, RecordRow
+from sql.zot_music import get_session, to_orm
+from constants import NumberOfReviews, MinRating, MaxRating, Seed, RecordLatestEndDate, \
+    NullValueProbability, ChunkSize, LatestActivityTime, GeneratorConfig
 
 # Initialize the Faker instance with the seed
 faker = Faker()
@@ -19,57 +24,84 @@ Faker.seed(Seed)
 def random_null(probability=0.2):
     return None if random.random() < probability else True
 
-def create_reviews(listeners: List[Listener], records: List[Record]) -> List[Review]:
+def iter_reviews(keys: ParentKeys, chunk_size: int = ChunkSize, count: int = NumberOfReviews,
+                 popularity: Popularity = None, start_time: datetime = RecordLatestEndDate,
+                 end_time: datetime = LatestActivityTime) -> Iterator[List[ReviewRow]]:
+    """
+    Generate count (NumberOfReviews by default) reviews and yield them in lists of at most chunk_size.
+    Listeners and records are picked by index from keys, uniformly or by their popularity when given.
+    Reviews are posted between start_time and end_time.
+    """
+    listener_count, record_count = keys.listener_count, len(keys.record_ids)
     reviews = []
 
-    for i in range(NumberOfReviews):
-        review_id = generate_unique_id("review")
-        listener = random.choice(listeners)  # Randomly pick a listener
-        record = random.choice(records)      # Randomly pick a record
+    for i in range(count):
+        if not reviews:
+            # Ids are generated in bulk, one chunk at a time
+            review_ids = generate_ids("review", min(chunk_size, count - i))
+        review_id = review_ids[len(reviews)]
+        if popularity is None:
+            listener = random.randrange(listener_count)  # Randomly pick a listener
+            record = random.randrange(record_count)      # Randomly pick a record
+        else:
+            listener = popularity.listeners.draw()
+            record = popularity.records.draw()
         rating = random.randint(MinRating, MaxRating)  # Random rating between min and max
 
         # Generate random review body text, but make it occasionally NULL
         if random_null(NullValueProbability):  # 30% chance of being NULL
             review_body = None
         else:
-            review_body = faker.text(max_nb_chars=200).replace(",", ' ').replace('\n', ' ').replace("\r", " ")
+            review_body = pool_text(200).replace(",", ' ').replace('\n', ' ').replace("\r", " ")
 
-        review = Review(
+        review = ReviewRow(
             review_id=review_id,
-            user_id=listener.user_id,
-            record_id=record.record_id,
+            user_id=key_at(keys.listener_ids, listener),
+            record_id=key_at(keys.record_ids, record),
             rating=rating,
             body=review_body,  # Set the review body, which might be NULL
-            posted_at=faker.date_time_between(start_date=RecordLatestEndDate, end_date='now')  # Random timestamp
+            posted_at=faker.date_time_between(start_date=start_time, end_date=end_time)  # Random timestamp
         )
         reviews.append(review)
 
-    return reviews
+        if len(reviews) >= chunk_size:
+            yield reviews
+            reviews = []
+
+    if reviews:
+        yield reviews
+
+def create_reviews(listeners: List[ListenerRow], records: List[RecordRow], config: GeneratorConfig = None) -> List[ReviewRow]:
+    count = (config or GeneratorConfig()).reviews
+    keys = ParentKeys.from_rows(listeners=listeners, records=records)
+    return [review for chunk in iter_reviews(keys, count=count) for review in chunk]
 
 # Adjust the main code to commit reviews
 if __name__ == "__main__":
+    session = get_session()
+
     # Create genres, users, listeners, and artists and insert them into the database
     users, listeners, artists = create_users_listeners_artists()
 
     # Commit genres, users, listeners, and artists first
-    session.add_all(users + artists + listeners)
+    session.add_all(to_orm(users + artists + listeners))
     session.commit()
 
     # Create records, singles, albums, and songs
     records, singles, albums, songs = create_records_singles_albums_songs(artists)
 
     # Commit records, singles, albums, and songs
-    session.add_all(records + singles + albums + songs)
+    session.add_all(to_orm(records + singles + albums + songs))
     session.commit()
 
     # Create sessions and commit them
     sessions = create_sessions(listeners, songs)
-    session.add_all(sessions)
+    session.add_all(to_orm(sessions))
     session.commit()
 
     # Create reviews and commit them
     reviews = create_reviews(listeners, records)
-    session.add_all(reviews)
+    session.add_all(to_orm(reviews))
     session.commit()
 
     print(f"Created {len(users)} users, {len(listeners)} listeners, {len(artists)} artists, {len(records)} records, "
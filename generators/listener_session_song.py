@@ -1,13 +1,20 @@
-from typing import List
+from typing import Iterator, List
 import random
+import numpy as np
 from faker import Faker
 from datetime import datetime, timedelta
 
 from generators.record_single_album_song import create_records_singles_albums_songs
 from generators.user_artist_listener import create_users_listeners_artists
-from sql.zot_music import Song, Session, Listener, session
+from generators.columnar import ColumnBatch
+from generators.ids import generate_ids, generate_id_array
+from generators.keys import ParentKeys, key_at
+from generators.seeds import derive_seed
+from generators.popularity import Popularity
+from generators.rows import SongRow, SessionRow, ListenerRow
+from sql.zot_music import get_session, to_orm
 from constants import NumberOfSessions, EarliestSessionStartTime, Seed, MUSIC_QUALITY_OPTIONS, DEVICE_OPTIONS, \
-    generate_unique_id, NullValueProbability
+    NullValueProbability, ChunkSize, LatestActivityTime, GeneratorConfig
 
 # Initialize Faker with seed
 faker = Faker()
@@ -18,37 +25,54 @@ Faker.seed(Seed)
 def random_null(probability=0.2):
     return None if random.random() < probability else True
 
-def create_sessions(listeners: List[Listener], songs: List[Song]) -> List[Session]:
+def iter_sessions(keys: ParentKeys, chunk_size: int = ChunkSize, count: int = NumberOfSessions,
+                  popularity: Popularity = None, start_time: datetime = EarliestSessionStartTime,
+                  end_time: datetime = LatestActivityTime) -> Iterator[List[SessionRow]]:
+    """
+    Generate count (NumberOfSessions by default) sessions and yield them in lists of at most chunk_size,
+    so callers can stream them into a sink without holding the whole table.
+    Listeners and songs are picked by index from keys, uniformly or by their popularity when given.
+    Sessions start between start_time and end_time.
+    """
+    # Only the picked elements are read, so memory-mapped keys stay on disk
+    listener_count, song_count = keys.listener_count, keys.song_count
     sessions = []
 
     # Generate sessions
-    for i in range(NumberOfSessions):
-        session_id = generate_unique_id("session")
+    for i in range(count):
+        if not sessions:
+            # Ids are generated in bulk, one chunk at a time
+            session_ids = generate_ids("session", min(chunk_size, count - i))
+        session_id = session_ids[len(sessions)]
 
         # Randomly select a listener and a song for this session
-        listener = random.choice(listeners)
-        song = random.choice(songs)
+        if popularity is None:
+            listener = random.randrange(listener_count)
+            song = random.randrange(song_count)
+        else:
+            listener = popularity.listeners.draw()
+            song = popularity.songs.draw()
 
         # Ensure the session length is no longer than the song length
-        session_length = random.randint(1, song.length)  # The session length can't exceed the song's length (in seconds)
+        session_length = random.randint(1, key_at(keys.song_lengths, song))  # The session length can't exceed the song's length (in seconds)
 
         # Generate random start time
-        start_time = faker.date_time_between(start_date=EarliestSessionStartTime, end_date="now")
+        initiate_at = faker.date_time_between(start_date=start_time, end_date=end_time)
 
         # Calculate the end time based on the session length
-        end_time = start_time + timedelta(seconds=session_length)
+        leave_at = initiate_at + timedelta(seconds=session_length)
 
         # Add a random delta (pause) to the end_time
         pause_delta = timedelta(seconds=random.randint(0, 100))  # Random pause between 1 and 100 seconds
-        end_time_with_delta = end_time + pause_delta
+        end_time_with_delta = leave_at + pause_delta
 
         # Create the session
-        session_obj = Session(
+        session_obj = SessionRow(
             session_id=session_id,
-            user_id=listener.user_id,
-            record_id=song.record_id,
-            track_number=song.track_number,
-            initiate_at=start_time,
+            user_id=key_at(keys.listener_ids, listener),
+            record_id=key_at(keys.record_ids, key_at(keys.song_record_idx, song)),
+            track_number=key_at(keys.song_track_numbers, song),
+            initiate_at=initiate_at,
             leave_at=end_time_with_delta,  # Using the end time with added delta (pause)
             music_quality=random.choice(MUSIC_QUALITY_OPTIONS),
             device=random.choice(DEVICE_OPTIONS),
@@ -57,30 +81,89 @@ def create_sessions(listeners: List[Listener], songs: List[Song]) -> List[Sessio
         )
         sessions.append(session_obj)
 
-    # Add and commit all sessions
-    session.add_all(sessions)
-    session.commit()
-
-    return sessions
+        if len(sessions) >= chunk_size:
+            yield sessions
+            sessions = []
+
+    if sessions:
+        yield sessions
+
+def iter_session_batches(keys: ParentKeys, chunk_size: int = ChunkSize,
+                         count: int = NumberOfSessions, seed: int = Seed,
+                         popularity: Popularity = None, rng: np.random.Generator = None,
+                         start_time: datetime = EarliestSessionStartTime,
+                         end_time: datetime = LatestActivityTime) -> Iterator[ColumnBatch]:
+    """
+    Vectorized counterpart of iter_sessions: every column of a chunk is drawn as one NumPy array
+    and the chunk is handed out as a ColumnBatch of those arrays, without building a Python value per session.
+    Draws from its own NumPy generator (seeded with derive_seed(seed, 'sessions'), or rng when given, e.g. to save
+    and restore its state between chunks), so the rows differ from iter_sessions for the same seed.
+    """
+    if rng is None:
+        rng = np.random.default_rng(derive_seed(seed, 'sessions'))
+    song_track_numbers = keys.song_track_numbers
+    song_lengths = keys.song_lengths
+    qualities = np.array(MUSIC_QUALITY_OPTIONS, dtype=object)
+    devices = np.array(DEVICE_OPTIONS, dtype=object)
+    earliest = np.datetime64(start_time, 's').astype(np.int64)
+    latest = np.datetime64(end_time, 's').astype(np.int64)
+
+    for offset in range(0, count, chunk_size):
+        size = min(chunk_size, count - offset)
+        if popularity is None:
+            listener_idx = rng.integers(0, keys.listener_count, size)
+            song_idx = rng.integers(0, len(song_lengths), size)
+        else:
+            listener_idx = popularity.listeners.sample(rng, size)
+            song_idx = popularity.songs.sample(rng, size)
+
+        # The session length can't exceed the song's length (in seconds)
+        session_length = rng.integers(1, song_lengths[song_idx] + 1)
+        initiate = rng.integers(earliest, latest, size)
+        # End time is the start plus the session length plus a random pause of 0 to 100 seconds
+        leave = initiate + session_length + rng.integers(0, 101, size)
+
+        replay_count = rng.integers(0, 6, size)
+        replay_nulls = rng.random(size) < NullValueProbability
+
+        yield ColumnBatch('Sessions', {
+            'session_id': generate_id_array("session", size, rng),
+            'user_id': keys.listener_ids_at(listener_idx),
+            'record_id': keys.song_record_ids(song_idx),
+            'track_number': song_track_numbers[song_idx],
+            'initiate_at': initiate.astype('datetime64[s]'),
+            'leave_at': leave.astype('datetime64[s]'),
+            'music_quality': qualities[rng.integers(0, len(qualities), size)],
+            'device': devices[rng.integers(0, len(devices), size)],
+            'remaining_time': session_length,
+            'replay_count': replay_count,
+        }, nulls={'replay_count': replay_nulls})
+
+def create_sessions(listeners: List[ListenerRow], songs: List[SongRow], config: GeneratorConfig = None) -> List[SessionRow]:
+    count = (config or GeneratorConfig()).sessions
+    keys = ParentKeys.from_rows(listeners=listeners, songs=songs)
+    return [session_obj for chunk in iter_sessions(keys, count=count) for session_obj in chunk]
 
 if __name__ == "__main__":
+    session = get_session()
+
     # Create genres, users, listeners, and artists and insert them into the database
     users, listeners, artists = create_users_listeners_artists()
 
     # Commit users, listeners, and artists
-    session.add_all(users + artists + listeners)
+    session.add_all(to_orm(users + artists + listeners))
     session.commit()
     print(f"Committed {len(users)} users, {len(listeners)} listeners, {len(artists)} artists")
 
     # Then create and commit records, singles, albums, and songs
     records, singles, albums, songs = create_records_singles_albums_songs(artists)
-    session.add_all(records + singles + albums + songs)
+    session.add_all(to_orm(records + singles + albums + songs))
     session.commit()
     print(f"Committed {len(records)} records, {len(singles)} singles, {len(albums)} albums, {len(songs)} songs")
 
     # Finally, create and commit sessions
     sessions = create_sessions(listeners, songs)
-    session.add_all(sessions)
+    session.add_all(to_orm(sessions))
     session.commit()
     print(f"Committed {len(sessions)} sessions")
 
@@ -0,0 +1,141 @@
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List
+
+from faker import Faker
+
+from constants import Seed, NumberOfShards, ParallelWorkers, NumberOfSessions, NumberOfReviews, NumberOfReviewLikes, \
+    SessionEngine, ReviewLikeEngine, ChunkSize
+from generators.seeds import derive_seed
+from generators.ids import next_id, reserve_ids, set_id_counter
+from generators.listener_like_review import iter_review_likes, iter_review_like_batches
+from generators.listener_review_record import iter_reviews
+from generators.listener_session_song import iter_sessions, iter_session_batches
+
+# Id prefix of the sharded tables that have their own ids
+ID_PREFIXES = {'Sessions': 'session', 'Reviews': 'review'}
+
+# Reference tables of the current worker process, set once per worker by _init_worker
+_references = {}
+
+
+def shard_seed(seed: int, table_name: str, shard_index: int, piece_index: int = 0) -> int:
+    """
+    Derive a stable seed for one piece of a shard of a table. Independent of the process that runs the piece.
+    """
+    return derive_seed(seed, table_name, shard_index, piece_index)
+
+
+def shard_counts(total: int, shards: int) -> List[int]:
+    """
+    Split total rows into shards as evenly as possible, larger shards first.
+    """
+    return [total // shards + (1 if i < total % shards else 0) for i in range(shards)]
+
+
+def shard_pieces(count: int, chunk_size: int = ChunkSize) -> List[int]:
+    """
+    Split the rows of a shard into pieces of at most chunk_size rows, the units the workers generate.
+    """
+    return shard_counts(count, max(-(-count // chunk_size), 1))
+
+
+def _init_worker(references):
+    _references.update(references)
+
+
+def _generate_shard(task):
+    table_name, shard_index, piece_index, count, id_start, review_ids = task
+
+    # Reseed the module-level random and the shared Faker random that the generators draw from
+    seed = shard_seed(Seed, table_name, shard_index, piece_index)
+    random.seed(seed)
+    Faker.seed(seed)
+    # Counter ids ("int"/"base32") of this piece continue where the previous piece ends
+    if table_name in ID_PREFIXES:
+        set_id_counter(ID_PREFIXES[table_name], id_start)
+
+    chunk_size = max(count, 1)
+    if table_name == 'Sessions' and SessionEngine == "numpy":
+        # A piece is a single ColumnBatch
+        return next(iter_session_batches(_references['keys'], chunk_size, count=count, seed=seed,
+                                         popularity=_references['popularity']), [])
+    if table_name == 'ReviewLikes' and ReviewLikeEngine == "numpy":
+        # Pieces like disjoint slices of the reviews, so their likes never collide
+        return next(iter_review_like_batches(review_ids, _references['keys'], chunk_size, count=count, seed=seed), [])
+    if table_name == 'Sessions':
+        chunks = iter_sessions(_references['keys'], chunk_size, count=count, popularity=_references['popularity'])
+    elif table_name == 'Reviews':
+        chunks = iter_reviews(_references['keys'], chunk_size, count=count, popularity=_references['popularity'])
+    else:
+        chunks = iter_review_likes(review_ids, _references['keys'], chunk_size, count=count)
+    return [obj for chunk in chunks for obj in chunk]
+
+
+class ShardPool:
+    """
+    Process pool that generates sessions, reviews and review likes shard by shard.
+    Every shard is generated as pieces of at most ChunkSize rows, each seeded from (Seed, shard, piece), so the
+    output only depends on Seed, the number of shards and ChunkSize. Pieces are yielded in order, one chunk each.
+    Every table method takes first_chunk to skip the pieces that an interrupted run already wrote.
+    Workers receive the parents as a ParentKeys (a few arrays) once, when they start.
+    """
+
+    def __init__(self, keys, popularity=None, shards=NumberOfShards, workers=ParallelWorkers,
+                 chunk_size=ChunkSize):
+        references = {'popularity': popularity, 'keys': keys}
+        self.shards = shards
+        self.chunk_size = chunk_size
+        # Bound the rows of the pieces submitted but not yet written: two pieces per worker
+        self.max_pending_rows = 2 * workers * chunk_size
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(references,))
+
+    def _run(self, tasks, first_chunk=0, reserve=None) -> Iterator[list]:
+        pending, pending_rows = deque(), 0
+        for task in islice(tasks, first_chunk, None):
+            # Backpressure: wait for the oldest piece while the pending ones hold too many rows
+            while pending and pending_rows + task[3] > self.max_pending_rows:
+                rows, future = pending.popleft()
+                pending_rows -= rows
+                yield future.result()
+            pending.append((task[3], self.executor.submit(_generate_shard, task)))
+            pending_rows += task[3]
+        while pending:
+            yield pending.popleft()[1].result()
+        if reserve is not None:
+            # Only advance this process's counter once the whole table is out, so a resumed run
+            # that restores the counter hands out the same ranges
+            reserve_ids(*reserve)
+
+    def _tasks(self, table_name, total, review_ids=None):
+        # Counter ids of a table are handed out in piece order, starting at this process's counter;
+        # review likes split the reviews into contiguous slices, one per shard and then one per piece
+        start = next_id(ID_PREFIXES[table_name]) if table_name in ID_PREFIXES else None
+        review_start = 0
+        review_counts = shard_counts(len(review_ids), self.shards) if review_ids is not None else None
+        for shard_index, count in enumerate(shard_counts(total, self.shards)):
+            pieces = shard_pieces(count, self.chunk_size)
+            review_slices = shard_counts(review_counts[shard_index], len(pieces)) if review_ids is not None else None
+            for piece_index, piece in enumerate(pieces):
+                reviews = None
+                if review_ids is not None:
+                    reviews = review_ids[review_start:review_start + review_slices[piece_index]]
+                    review_start += review_slices[piece_index]
+                yield table_name, shard_index, piece_index, piece, start, reviews
+                if start is not None:
+                    start += piece
+
+    def sessions(self, total=NumberOfSessions, first_chunk=0) -> Iterator[list]:
+        return self._run(self._tasks('Sessions', total), first_chunk, reserve=(ID_PREFIXES['Sessions'], total))
+
+    def reviews(self, total=NumberOfReviews, first_chunk=0) -> Iterator[list]:
+        return self._run(self._tasks('Reviews', total), first_chunk, reserve=(ID_PREFIXES['Reviews'], total))
+
+    def review_likes(self, review_ids: List[str], total=NumberOfReviewLikes, first_chunk=0) -> Iterator[list]:
+        # Every piece likes its own contiguous slice of the reviews
+        return self._run(self._tasks('ReviewLikes', total, review_ids), first_chunk)
+
+    def close(self):
+        self.executor.shutdown()
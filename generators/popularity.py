@@ -0,0 +1,97 @@
+import random
+
+import numpy as np
+
+from constants import Seed, PopularityModel, ListenerActivityExponent, ArtistPopularityExponent, \
+    SongPopularityExponent, RecordPopularityExponent
+from generators.seeds import derive_seed
+
+
+class AliasTable:
+    """
+    Walker/Vose alias table over n weighted items: after an O(n) build every weighted draw costs O(1),
+    whether drawn one at a time from the random module or vectorized from a NumPy generator.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        scaled = (weights * (n / weights.sum())).tolist()
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is (up to rounding) exactly 1 and keeps prob 1.0
+
+        self.n = n
+        self.prob = np.array(prob)
+        self.alias = np.array(alias, dtype=np.int64)
+        # Plain lists are faster than NumPy arrays for scalar indexing
+        self.prob_list = prob
+        self.alias_list = alias
+
+    def __getstate__(self):
+        # Ship only the arrays to worker processes; the lists are rebuilt on arrival
+        return {'prob': self.prob, 'alias': self.alias}
+
+    def __setstate__(self, state):
+        self.prob, self.alias = state['prob'], state['alias']
+        self.n = len(self.prob)
+        self.prob_list = self.prob.tolist()
+        self.alias_list = self.alias.tolist()
+
+    def draw(self) -> int:
+        """Draw one index using the seeded random module."""
+        i = int(random.random() * self.n)
+        return i if random.random() < self.prob_list[i] else self.alias_list[i]
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw size indices at once from a NumPy generator."""
+        i = rng.integers(0, self.n, size)
+        return np.where(rng.random(size) < self.prob[i], i, self.alias[i])
+
+
+def zipf_weights(n: int, exponent: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Power-law weights rank ** -exponent, with the ranks shuffled so popularity doesn't follow generation order.
+    """
+    return (np.arange(1, n + 1, dtype=np.float64) ** -exponent)[rng.permutation(n)]
+
+
+class Popularity:
+    """
+    Skewed popularity of listeners (activity), records and songs, over the indexes of a ParentKeys.
+    A song's weight is its own Zipf weight times the popularity of the artist of its record; records likewise.
+    Built from a random stream derived from Seed, so the tables don't depend on (or consume) the generators' streams.
+    """
+
+    def __init__(self, keys, seed=Seed):
+        rng = np.random.default_rng(derive_seed(seed, 'popularity'))
+        artist_weight = zipf_weights(keys.artist_count, ArtistPopularityExponent, rng)
+        record_artist_weight = artist_weight[keys.record_artist_idx]
+
+        self.listeners = AliasTable(zipf_weights(keys.listener_count, ListenerActivityExponent, rng))
+        self.records = AliasTable(
+            zipf_weights(len(keys.record_ids), RecordPopularityExponent, rng) * record_artist_weight
+        )
+        self.songs = AliasTable(
+            zipf_weights(keys.song_count, SongPopularityExponent, rng) * record_artist_weight[keys.song_record_idx]
+        )
+
+
+def build_popularity(keys):
+    """
+    Return the Popularity tables (over the indexes of a ParentKeys) for the configured PopularityModel,
+    or None for uniform picks.
+    """
+    if PopularityModel == "uniform":
+        return None
+    if PopularityModel == "zipf":
+        return Popularity(keys)
+    raise ValueError(f"Unknown PopularityModel: {PopularityModel}")
@@ -1,12 +1,19 @@
 from typing import List
 import random
+
+import numpy as np
 from faker import Faker
 from datetime import datetime
 
 from generators.user_artist_listener import create_users_listeners_artists
-from sql.zot_music import Artist, Record, Single, Album, Song, session
-from constants import NumberOfAlbums, NumberOfRecords, NumberOfSingles, MinSongDuration, MaxSongDuration, Seed, \
-    RecordEarliestStartDate, RecordLatestEndDate, GENRES_LIST, generate_unique_id, NullValueProbability
+from generators.columnar import ColumnBatch, column_values, with_nulls
+from generators.ids import generate_ids
+from generators.seeds import derive_seed
+from generators.text_pool import pool_text, pool_title, pool_word, pool_url, pool_choices, pool_texts
+from generators.rows import ArtistRow, RecordRow, SingleRow, AlbumRow, SongRow
+from sql.zot_music import get_session, to_orm
+from constants import GeneratorConfig, MinSongDuration, MaxSongDuration, Seed, \
+    RecordEarliestStartDate, RecordLatestEndDate, GENRES_LIST, NullValueProbability
 
 # Initialize the Faker instance with the seed
 faker = Faker()
@@ -17,34 +24,42 @@ Faker.seed(Seed)
 def random_null(probability=NullValueProbability):
     return None if random.random() < probability else True
 
-def create_records_singles_albums_songs(artists: List[Artist]) -> (List[Record], List[Single], List[Album], List[Song]):
+def create_records_singles_albums_songs(artists: List[ArtistRow], config: GeneratorConfig = None) \
+        -> (List[RecordRow], List[SingleRow], List[AlbumRow], List[SongRow]):
+    if config is None:
+        config = GeneratorConfig()
+    number_of_records, number_of_singles = config.records, config.singles
+
     records = []
     singles = []
     albums = []
     songs = []
 
     # Generate random release dates for records
-    release_dates = [faker.date_between(start_date=RecordEarliestStartDate, end_date=RecordLatestEndDate) for _ in range(NumberOfRecords)]
+    release_dates = [faker.date_between(start_date=RecordEarliestStartDate, end_date=RecordLatestEndDate) for _ in range(number_of_records)]
+
+    record_ids = generate_ids("record", number_of_records)
+    artist_ids = column_values(artists, 'user_id')
 
     # Create singles and albums
-    for i in range(NumberOfRecords):
-        record_id = generate_unique_id("record")
-        artist = artists[i % len(artists)]
+    for i in range(number_of_records):
+        record_id = record_ids[i]
+        artist_id = artist_ids[i % len(artist_ids)]
         # Apply random nullability to release_date
         release_date = release_dates[i] if random_null(probability=NullValueProbability) else None
-        title = faker.sentence(nb_words=3).rstrip('.')  # Generate random song/record title without trailing dot
+        title = pool_title()  # Generate random song/record title without trailing dot
         chosen_genre = random.sample(GENRES_LIST, 1)[0]  # Random genre selection from list
 
-        if i < NumberOfSingles:
+        if i < number_of_singles:
             # Create a single
-            video_url = faker.url()
-            single = Single(
+            video_url = pool_url()
+            single = SingleRow(
                 record_id=record_id,
                 video_url=video_url
             )
-            record = Record(
+            record = RecordRow(
                 record_id=record_id,
-                artist_user_id=artist.user_id,
+                artist_user_id=artist_id,
                 title=title,
                 release_date=release_date,
                 genre=chosen_genre
@@ -53,25 +68,25 @@ def create_records_singles_albums_songs(artists: List[Artist]) -> (List[Record],
             singles.append(single)
 
             # Each single gets exactly 1 song
-            song = Song(
+            song = SongRow(
                 record_id=record_id,
                 track_number=1,
                 title=title,
                 length=random.randint(MinSongDuration, MaxSongDuration),
                 bpm=random.randint(60, 180) if random_null(probability=NullValueProbability) else None,  # Randomly null bpm
-                mood=faker.word()
+                mood=pool_word()
             )
             songs.append(song)
         else:
             # Create an album
-            description = faker.text(max_nb_chars=200) if random_null(probability=NullValueProbability) else None  # Randomly null description
-            album = Album(
+            description = pool_text(200) if random_null(probability=NullValueProbability) else None  # Randomly null description
+            album = AlbumRow(
                 record_id=record_id,
                 description=description
             )
-            record = Record(
+            record = RecordRow(
                 record_id=record_id,
-                artist_user_id=artist.user_id,
+                artist_user_id=artist_id,
                 title=title,
                 release_date=release_date,
                 genre=chosen_genre
@@ -82,27 +97,91 @@ def create_records_singles_albums_songs(artists: List[Artist]) -> (List[Record],
             # Each album gets multiple songs (randomized number between 5 and 12)
             num_songs = random.randint(5, 12)  # Each album has between 5 to 12 songs
             for track_num in range(1, num_songs + 1):
-                song_title = faker.sentence(nb_words=3).rstrip('.')  # Generate a random song title without trailing dot
-                song = Song(
+                song_title = pool_title()  # Generate a random song title without trailing dot
+                song = SongRow(
                     record_id=record_id,
                     track_number=track_num,
                     title=song_title,
                     length=random.randint(MinSongDuration, MaxSongDuration),
                     bpm=random.randint(60, 180) if random_null(probability=NullValueProbability) else None,  # Randomly null bpm
-                    mood=faker.word()
+                    mood=pool_word()
                 )
                 songs.append(song)
 
     return records, singles, albums, songs
 
+
+def create_catalog_batches(artists, config: GeneratorConfig = None, seed: int = Seed) \
+        -> (ColumnBatch, ColumnBatch, ColumnBatch, ColumnBatch):
+    """
+    Columnar version of create_records_singles_albums_songs (artists as rows or a ColumnBatch): every column is
+    drawn for all rows at once from its own NumPy generator, so the rows differ from the row-by-row version.
+    The track counts of all albums are drawn first; their prefix sums give the offset of every record's songs,
+    so the song columns are filled in one pass and the songs of records [a, b) are rows offsets[a]:offsets[b].
+    """
+    if config is None:
+        config = GeneratorConfig()
+    number_of_records, number_of_singles = config.records, config.singles
+    number_of_albums = number_of_records - number_of_singles
+    rng = np.random.default_rng(derive_seed(seed, 'catalog'))
+
+    record_ids = generate_ids("record", number_of_records, rng)
+    artist_ids = np.asarray(column_values(artists, 'user_id'), dtype=object)
+    days = rng.integers(0, (RecordLatestEndDate - RecordEarliestStartDate).days + 1, number_of_records)
+    release_dates = (np.datetime64(RecordEarliestStartDate.date()) + days).astype(object)
+    titles = pool_choices('titles', rng, number_of_records)
+    genres = np.array(GENRES_LIST, dtype=object)[rng.integers(0, len(GENRES_LIST), number_of_records)]
+    records = ColumnBatch('Records', {
+        'record_id': record_ids,
+        'artist_user_id': artist_ids[np.arange(number_of_records) % len(artist_ids)].tolist(),
+        'title': titles,
+        'release_date': with_nulls(release_dates, rng),
+        'genre': genres.tolist(),
+    })
+    singles = ColumnBatch('Singles', {
+        'record_id': record_ids[:number_of_singles],
+        'video_url': pool_choices('urls', rng, number_of_singles),
+    })
+    # Only the descriptions that aren't null are drawn
+    descriptions = np.full(number_of_albums, None, dtype=object)
+    described = rng.random(number_of_albums) >= NullValueProbability
+    descriptions[described] = pool_texts(rng, int(described.sum()), 200)
+    albums = ColumnBatch('Albums', {
+        'record_id': record_ids[number_of_singles:],
+        'description': descriptions.tolist(),
+    })
+
+    # A single has one song, an album 5 to 12
+    track_counts = np.ones(number_of_records, dtype=np.int64)
+    track_counts[number_of_singles:] = rng.integers(5, 13, number_of_albums)
+    offsets = np.zeros(number_of_records + 1, dtype=np.int64)
+    np.cumsum(track_counts, out=offsets[1:])
+    number_of_songs = int(offsets[-1])
+    song_record_idx = np.repeat(np.arange(number_of_records), track_counts)
+    # The song of a single is named after it
+    song_titles = np.empty(number_of_songs, dtype=object)
+    song_titles[offsets[:number_of_singles]] = titles[:number_of_singles]
+    song_titles[offsets[number_of_singles]:] = pool_choices('titles', rng, number_of_songs - int(offsets[number_of_singles]))
+    songs = ColumnBatch('Songs', {
+        'record_id': np.asarray(record_ids, dtype=object)[song_record_idx].tolist(),
+        'track_number': (np.arange(number_of_songs) - offsets[song_record_idx] + 1).tolist(),
+        'title': song_titles.tolist(),
+        'length': rng.integers(MinSongDuration, MaxSongDuration + 1, number_of_songs).tolist(),
+        'bpm': with_nulls(rng.integers(60, 181, number_of_songs), rng),
+        'mood': pool_choices('words', rng, number_of_songs),
+    })
+    return records, singles, albums, songs
+
 # Example Usage
 if __name__ == "__main__":
+    session = get_session()
+
     # Create users, listeners, and artists and insert them into the database
     users, listeners, artists = create_users_listeners_artists()
 
     # Then create records, singles, albums, and songs
     records, singles, albums, songs = create_records_singles_albums_songs(artists)
 
-    session.add_all(users + artists + listeners + records + singles + albums + songs)
+    session.add_all(to_orm(users + artists + listeners + records + singles + albums + songs))
     session.commit()
     print(f"Created {len(users)} users, {len(listeners)} listeners, {len(artists)} artists, {len(records)} records, {len(singles)} singles, {len(albums)} albums, {len(songs)} songs")
@@ -0,0 +1,28 @@
+from collections import namedtuple
+
+
+def row_type(name, table_name, columns):
+    """
+    A namedtuple class for the rows of one table, with the columns in export order. Rows have no per-instance
+    __dict__ (only the tuple itself), and table_name says which table (and ORM model) they belong to.
+    """
+    return type(name, (namedtuple(name, columns),), {'__slots__': (), 'table_name': table_name, '__module__': __name__})
+
+
+# Rows produced by the generators, one type per table. Only the ORM sink turns them into ORM instances.
+UserRow = row_type('UserRow', 'Users', ['user_id', 'email', 'joined_date', 'nickname', 'street', 'city', 'state', 'zip', 'genres'])
+ListenerRow = row_type('ListenerRow', 'Listeners', ['user_id', 'subscription', 'first_name', 'last_name'])
+ArtistRow = row_type('ArtistRow', 'Artists', ['user_id', 'bio', 'stagename'])
+RecordRow = row_type('RecordRow', 'Records', ['record_id', 'artist_user_id', 'title', 'release_date', 'genre'])
+SingleRow = row_type('SingleRow', 'Singles', ['record_id', 'video_url'])
+AlbumRow = row_type('AlbumRow', 'Albums', ['record_id', 'description'])
+SongRow = row_type('SongRow', 'Songs', ['record_id', 'track_number', 'title', 'length', 'bpm', 'mood'])
+SessionRow = row_type('SessionRow', 'Sessions', ['session_id', 'user_id', 'record_id', 'track_number', 'initiate_at', 'leave_at', 'music_quality', 'device', 'remaining_time', 'replay_count'])
+ReviewRow = row_type('ReviewRow', 'Reviews', ['review_id', 'user_id', 'record_id', 'rating', 'body', 'posted_at'])
+ReviewLikeRow = row_type('ReviewLikeRow', 'ReviewLikes', ['user_id', 'review_id'])
+
+ROW_TYPES = {row.table_name: row for row in (UserRow, ListenerRow, ArtistRow, RecordRow, SingleRow, AlbumRow, SongRow,
+                                             SessionRow, ReviewRow, ReviewLikeRow)}
+
+# Column order of every exported table, keyed by table name (files are named "<table>.csv")
+TABLE_COLUMNS = {table_name: list(row._fields) for table_name, row in ROW_TYPES.items()}
@@ -0,0 +1,26 @@
+import hashlib
+import random
+
+from faker import Faker
+
+from generators import ids
+
+
+def derive_seed(seed: int, *labels) -> int:
+    """
+    Derive a stable 64-bit seed for one independent random stream (a shard, a text pool, ...) from the
+    global seed and some labels. Independent of the process and of the order streams are created in.
+    """
+    digest = hashlib.sha256(":".join(str(part) for part in (seed,) + labels).encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def reseed(seed: int):
+    """
+    Put every shared random stream (the random module, the shared Faker random and the id counters) back to its
+    state right after import, so a dataset generated later in a process is the same as in a fresh process.
+    """
+    random.seed(seed)
+    Faker.seed(seed)
+    ids._counters.clear()
+    ids.set_uuid_seed(seed)
@@ -0,0 +1,145 @@
+import json
+import os
+import random
+
+import numpy as np
+from faker import Faker
+
+from generators.seeds import derive_seed
+from constants import Seed, TextPoolSize, TextPoolCacheDir, FakerLocale
+
+# How each pool is filled from Faker
+TEXT_POOL_KINDS = {
+    'sentences': lambda faker: faker.sentence(),
+    'titles': lambda faker: faker.sentence(nb_words=3).rstrip('.'),
+    'words': lambda faker: faker.word(),
+    'urls': lambda faker: faker.url(),
+    # User profiles and addresses
+    'user_names': lambda faker: faker.user_name(),
+    'first_names': lambda faker: faker.first_name(),
+    'last_names': lambda faker: faker.last_name(),
+    'streets': lambda faker: faker.street_address(),
+    'cities': lambda faker: faker.city(),
+    'states': lambda faker: faker.state(),
+    'zipcodes': lambda faker: faker.zipcode(),
+}
+
+# Faker used when pools are disabled (TextPoolSize = 0); draws from the shared, seeded Faker random
+faker = Faker(FakerLocale)
+
+# Pools built (or loaded) in this process, keyed by (kind, size, seed, locale)
+_pools = {}
+
+
+def build_text_pool(kind, size=TextPoolSize, seed=Seed, locale=FakerLocale, cache_dir=TextPoolCacheDir):
+    """
+    Generate size candidates of one kind with a Faker instance seeded from (seed, kind), so the pool is the same
+    in every process and doesn't consume the generators' random streams. Pools are cached in cache_dir,
+    keyed by kind, size, seed and locale.
+    """
+    key = (kind, size, seed, locale)
+    if key in _pools:
+        return _pools[key]
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f'{kind}-{locale}-{seed}-{size}.json')
+        if os.path.exists(cache_path):
+            with open(cache_path) as file:
+                _pools[key] = json.load(file)
+            return _pools[key]
+
+    pool_faker = Faker(locale)
+    pool_faker.seed_instance(derive_seed(seed, kind))
+    values = [TEXT_POOL_KINDS[kind](pool_faker) for _ in range(size)]
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so concurrent workers never read a partial pool
+        temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(values, file)
+        os.replace(temporary_path, cache_path)
+
+    _pools[key] = values
+    return values
+
+
+def pool_text(max_chars=200):
+    """
+    Like faker.text(max_nb_chars=max_chars): pooled sentences are combined until the next one would not fit.
+    Combining fragments gives far more distinct texts than the pool size.
+    """
+    if not TextPoolSize:
+        return faker.text(max_nb_chars=max_chars)
+    sentences = build_text_pool('sentences')
+    text = ''
+    while True:
+        sentence = sentences[random.randrange(len(sentences))]
+        candidate = f'{text} {sentence}' if text else sentence
+        if len(candidate) > max_chars:
+            break
+        text = candidate
+    if not text:
+        # Not even one sentence fits: cut the sentence at a word boundary instead
+        text = sentence[:max_chars - 1].rsplit(' ', 1)[0].rstrip('.') + '.'
+    return text
+
+
+def pool_title():
+    """Three-word title without the trailing dot, like faker.sentence(nb_words=3).rstrip('.')."""
+    if not TextPoolSize:
+        return faker.sentence(nb_words=3).rstrip('.')
+    titles = build_text_pool('titles')
+    return titles[random.randrange(len(titles))]
+
+
+def pool_word():
+    """A single word, like faker.word()."""
+    if not TextPoolSize:
+        return faker.word()
+    words = build_text_pool('words')
+    return words[random.randrange(len(words))]
+
+
+def pool_url():
+    """A URL, like faker.url()."""
+    if not TextPoolSize:
+        return faker.url()
+    urls = build_text_pool('urls')
+    return urls[random.randrange(len(urls))]
+
+
+def pool_choices(kind, rng, count):
+    """
+    count values of one pool kind ("titles", "words", "urls", ...) drawn at once from a NumPy generator.
+    """
+    if not TextPoolSize:
+        return [TEXT_POOL_KINDS[kind](faker) for _ in range(count)]
+    pool = build_text_pool(kind)
+    return [pool[i] for i in rng.integers(0, len(pool), count).tolist()]
+
+
+def pool_texts(rng, count, max_chars=200):
+    """
+    count texts like pool_text(max_chars), with all sentence picks drawn at once from a NumPy generator:
+    each text is the longest run of its picks that fits, found from the running lengths of the picks.
+    """
+    if not TextPoolSize:
+        return [faker.text(max_nb_chars=max_chars) for _ in range(count)]
+    sentences = build_text_pool('sentences')
+    lengths = np.array([len(sentence) for sentence in sentences])
+    # Enough picks per text that the last one never fits
+    per_text = (max_chars + 1) // (lengths.min() + 1) + 2
+    picks = rng.integers(0, len(sentences), (count, per_text))
+    # Length of the text up to each pick, with the spaces between sentences
+    ends = np.cumsum(lengths[picks] + 1, axis=1) - 1
+    fits = (ends <= max_chars).sum(axis=1)
+    texts = []
+    for row, used in zip(picks.tolist(), fits.tolist()):
+        if used:
+            texts.append(' '.join([sentences[i] for i in row[:used]]))
+        else:
+            # Not even one sentence fits: cut it at a word boundary like pool_text
+            texts.append(sentences[row[0]][:max_chars - 1].rsplit(' ', 1)[0].rstrip('.') + '.')
+    return texts
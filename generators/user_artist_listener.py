@@ -1,10 +1,17 @@
 import uuid
 from typing import List
 import random
+
+import numpy as np
 from faker import Faker
-from sql.zot_music import User, Listener, Artist, session
-from constants import Seed, NumberOfUsers, NumberOfArtists, EarliestJoinTime, LatestJoinTime, \
-    GENRES_LIST, LISTENER_SUBSCRIPTION_OPTIONS, generate_unique_id, NullValueProbability
+from generators.columnar import ColumnBatch
+from generators.ids import generate_ids
+from generators.seeds import derive_seed
+from generators.text_pool import pool_text, pool_choices, pool_texts
+from generators.rows import UserRow, ListenerRow, ArtistRow
+from sql.zot_music import get_session, to_orm
+from constants import Seed, GeneratorConfig, EarliestJoinTime, LatestJoinTime, \
+    GENRES_LIST, LISTENER_SUBSCRIPTION_OPTIONS, NullValueProbability
 
 # Initialize the Faker instance with the seed
 faker = Faker()
@@ -17,26 +24,31 @@ EMAIL_DOMAINS = [
     "college.edu", "university.edu", "mail.com", "protonmail.com"
 ]
 
-def create_users_listeners_artists() -> (List[User], List[Listener], List[Artist]):
+def create_users_listeners_artists(config: GeneratorConfig = None) -> (List[UserRow], List[ListenerRow], List[ArtistRow]):
     """
-    Generate and return lists of Users, Listeners, and Artists.
+    Generate and return lists of Users, Listeners, and Artists, as many as the config (default: ScaleFactor) says.
     Some users may be both artists and listeners.
     """
+    if config is None:
+        config = GeneratorConfig()
+    number_of_users, number_of_artists = config.users, config.artists
+
     # Initialize empty lists
     users = []
     listeners = []
     artists = []
 
     # Generate user data using Faker
-    nicknames = [faker.user_name() for _ in range(NumberOfUsers)]
-    join_dates = [faker.date_between(start_date=EarliestJoinTime, end_date=LatestJoinTime) for _ in range(NumberOfUsers)]
-    first_last_names = [(faker.first_name(), faker.last_name()) for _ in range(NumberOfUsers)]
+    nicknames = [faker.user_name() for _ in range(number_of_users)]
+    join_dates = [faker.date_between(start_date=EarliestJoinTime, end_date=LatestJoinTime) for _ in range(number_of_users)]
+    first_last_names = [(faker.first_name(), faker.last_name()) for _ in range(number_of_users)]
+    user_ids = generate_ids("user", number_of_users)  # Generate all user ids at once
 
     # Randomly select a subset of users to be both listeners and artists
-    overlap_users = set(random.sample(range(NumberOfUsers), random.randint(1, NumberOfUsers // 2)))
+    overlap_users = set(random.sample(range(number_of_users), random.randint(1, number_of_users // 2)))
 
-    for i in range(NumberOfUsers):
-        user_id = generate_unique_id("user")  # Generate a unique UUID for each user
+    for i in range(number_of_users):
+        user_id = user_ids[i]
 
         # Assign random genres to the user
         user_genres = ','.join(random.sample(GENRES_LIST, k=random.randint(1, 10)))  # Each user gets between 1 to 5 random genres
@@ -51,7 +63,7 @@ def create_users_listeners_artists() -> (List[User], List[Listener], List[Artist
         state = faker.state() if random.random() > NullValueProbability else None  # 30% chance of being NULL
         zip_code = faker.zipcode() if random.random() > NullValueProbability else None  # 10% chance of being NULL
 
-        user = User(
+        user = UserRow(
             user_id=user_id,
             email=email,  # NOT NULL
             joined_date=join_dates[i],  # NOT NULL
@@ -65,19 +77,19 @@ def create_users_listeners_artists() -> (List[User], List[Listener], List[Artist
         users.append(user)
 
         # If this user should be both an artist and a listener, create both roles
-        if i < NumberOfArtists or i in overlap_users:
+        if i < number_of_artists or i in overlap_users:
             # Create an artist
-            artist = Artist(
+            artist = ArtistRow(
                 user_id=user_id,
-                bio=faker.text(max_nb_chars=200),
-                stagename=faker.text(max_nb_chars=50).rstrip('.')
+                bio=pool_text(200),
+                stagename=pool_text(50).rstrip('.')
             )
             artists.append(artist)
 
-        if i >= NumberOfArtists or i in overlap_users:
+        if i >= number_of_artists or i in overlap_users:
             # Create a listener
             first_name, last_name = first_last_names[i]
-            listener = Listener(
+            listener = ListenerRow(
                 user_id=user_id,
                 first_name=first_name,
                 last_name=last_name,
@@ -88,12 +100,97 @@ def create_users_listeners_artists() -> (List[User], List[Listener], List[Artist
     return users, listeners, artists
 
 
+def genre_masks(rng, count, block=1_000_000):
+    """
+    The genres of count users as bitmasks over GENRES_LIST (bit j set: the user likes GENRES_LIST[j]), each with 1 to 10
+    distinct genres. Every user ranks the genres randomly and likes the ones ranked below their genre count;
+    users are drawn in blocks to bound the rank matrix.
+    """
+    bits = 1 << np.arange(len(GENRES_LIST), dtype=np.int64)
+    masks = np.empty(count, dtype=np.int64)
+    for start in range(0, count, block):
+        size = min(block, count - start)
+        genre_counts = rng.integers(1, 11, size)
+        ranks = rng.random((size, len(GENRES_LIST)), dtype=np.float32).argsort(axis=1).argsort(axis=1)
+        masks[start:start + size] = (ranks < genre_counts[:, None]) @ bits
+    return masks
+
+
+def render_genres(masks):
+    """The comma-separated genre lists of genre bitmasks; every distinct mask is rendered once."""
+    distinct, inverse = np.unique(masks, return_inverse=True)
+    names = np.array([','.join(genre for j, genre in enumerate(GENRES_LIST) if mask >> j & 1)
+                      for mask in distinct.tolist()], dtype=object)
+    return names[inverse.ravel()].tolist()
+
+
+def create_user_batches(config: GeneratorConfig = None, seed: int = Seed) -> (ColumnBatch, ColumnBatch, ColumnBatch):
+    """
+    Columnar version of create_users_listeners_artists, returning Users, Listeners and Artists ColumnBatches.
+    Every column is drawn for all users at once from one NumPy generator seeded with derive_seed(seed, 'users')
+    (profiles and addresses from the text pools, genres as bitmasks rendered in GENRES_LIST order), so the rows
+    differ from the row-by-row version. Nicknames (and so emails) are a pool user name followed by a random number,
+    so they stay mostly distinct although the pool is small.
+    """
+    if config is None:
+        config = GeneratorConfig()
+    number_of_users, number_of_artists = config.users, config.artists
+    rng = np.random.default_rng(derive_seed(seed, 'users'))
+
+    user_ids = np.asarray(generate_ids("user", number_of_users, rng), dtype=object)
+    nicknames = np.asarray(pool_choices('user_names', rng, number_of_users), dtype=object)
+    nicknames += rng.integers(0, max(number_of_users, 1000), number_of_users).astype(str).astype(object)
+    domains = np.asarray(EMAIL_DOMAINS, dtype=object)[rng.integers(0, len(EMAIL_DOMAINS), number_of_users)]
+    days = rng.integers(0, (LatestJoinTime - EarliestJoinTime).days + 1, number_of_users)
+    # Street, city, state and zip are each NULL with NullValueProbability
+    missing = rng.random((number_of_users, 4)) < NullValueProbability
+    address = {}
+    for j, (column, kind) in enumerate((('street', 'streets'), ('city', 'cities'), ('state', 'states'),
+                                        ('zip', 'zipcodes'))):
+        values = np.asarray(pool_choices(kind, rng, number_of_users), dtype=object)
+        values[missing[:, j]] = None
+        address[column] = values.tolist()
+    users = ColumnBatch('Users', {
+        'user_id': user_ids.tolist(),
+        'email': (nicknames + '@' + domains).tolist(),
+        'joined_date': (np.datetime64(EarliestJoinTime.date()) + days).astype(object).tolist(),
+        'nickname': nicknames.tolist(),
+        **address,
+        'genres': render_genres(genre_masks(rng, number_of_users)),
+    })
+
+    # The first number_of_artists users are artists, the others listeners, and a random overlap is both
+    overlap = np.zeros(number_of_users, dtype=bool)
+    overlap[rng.choice(number_of_users, rng.integers(1, max(1, number_of_users // 2) + 1), replace=False)] = True
+    index = np.arange(number_of_users)
+    is_artist = (index < number_of_artists) | overlap
+    is_listener = (index >= number_of_artists) | overlap
+
+    number_of_artist_rows = int(is_artist.sum())
+    artists = ColumnBatch('Artists', {
+        'user_id': user_ids[is_artist].tolist(),
+        'bio': pool_texts(rng, number_of_artist_rows, 200),
+        'stagename': [stagename.rstrip('.') for stagename in pool_texts(rng, number_of_artist_rows, 50)],
+    })
+    number_of_listeners = int(is_listener.sum())
+    subscriptions = np.asarray(LISTENER_SUBSCRIPTION_OPTIONS, dtype=object)
+    listeners = ColumnBatch('Listeners', {
+        'user_id': user_ids[is_listener].tolist(),
+        'subscription': subscriptions[rng.integers(0, len(subscriptions), number_of_listeners)].tolist(),
+        'first_name': pool_choices('first_names', rng, number_of_listeners),
+        'last_name': pool_choices('last_names', rng, number_of_listeners),
+    })
+    return users, listeners, artists
+
+
 # Example Usage
 if __name__ == "__main__":
+    session = get_session()
+
     # Create users, listeners, and artists and insert them into the database
     users, listeners, artists = create_users_listeners_artists()
 
     # Commit all users, listeners, and artists to the database
-    session.add_all(users + artists + listeners)
+    session.add_all(to_orm(users + artists + listeners))
     session.commit()
     print(f"Created {len(users)} users, {len(listeners)} listeners, and {len(artists)} artists.")
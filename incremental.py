@@ -0,0 +1,165 @@
+import dataclasses
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from constants import IdStrategy, EarliestSessionStartTime, RecordLatestEndDate, LatestActivityTime
+from exports.csv import read_csv
+from generators.columnar import ColumnBatch
+from generators.ids import id_counter, next_id
+from generators.keys import ParentKeys
+from sql.zot_music import Listener, Record, Song, Session, Review
+
+# Appended activity is written to <output dir>/DELTA_DIR_NAME/<start of its time window>/
+DELTA_DIR_NAME = 'deltas'
+
+# State of a generated dataset or delta directory (see write_state), read by the next append run
+STATE_FILE_NAME = 'dataset_state.json'
+
+# The tables an append run adds rows to, with the id and timestamp columns that say where the dataset ends
+ACTIVITY_TABLES = ((Session, 'session_id', 'initiate_at', 'session'), (Review, 'review_id', 'posted_at', 'review'))
+
+
+class ExistingDataset:
+    """
+    What an append run needs from a dataset generated before: its parent keys, the time of its latest session or
+    review (or the end of the window they were drawn from, see write_state), and the counter the next session and
+    review ids continue from (none for "uuid" ids, which are drawn from a fresh seed instead).
+    """
+
+    def __init__(self, keys, latest_activity, next_counters):
+        self.keys = keys
+        self.latest_activity = latest_activity
+        self.next_counters = next_counters
+
+    def window_start(self):
+        """When appended activity starts: right after the latest existing activity."""
+        if self.latest_activity is None:
+            return LatestActivityTime
+        return self.latest_activity + timedelta(seconds=1)
+
+
+def _last_id_key(value):
+    # Counter ids of the same strategy sort by length first ("session_z" < "session_10")
+    return value if IdStrategy == "int" else (len(value), value)
+
+
+def read_existing_database(engine):
+    """
+    Read an existing dataset from the database. Parents are read in primary key order, which for
+    "int" ids is the order they were generated in.
+    """
+    with engine.connect() as connection:
+        listeners = connection.execute(select(Listener.user_id).order_by(Listener.user_id)).all()
+        records = connection.execute(
+            select(Record.record_id, Record.artist_user_id).order_by(Record.record_id)).all()
+        songs = connection.execute(
+            select(Song.record_id, Song.track_number, Song.length).order_by(Song.record_id, Song.track_number)).all()
+        latest, next_counters = [], {}
+        for model, id_column, time_column, prefix in ACTIVITY_TABLES:
+            latest.append(connection.execute(select(func.max(getattr(model, time_column)))).scalar())
+            if IdStrategy == "uuid":
+                continue
+            column = getattr(model, id_column)
+            order = [column.desc()] if IdStrategy == "int" else [func.length(column).desc(), column.desc()]
+            last = connection.execute(select(column).order_by(*order).limit(1)).scalar()
+            next_counters[prefix] = id_counter(prefix, last) + 1 if last is not None else 1
+    latest = [value for value in latest if value is not None]
+    return ExistingDataset(ParentKeys.from_rows(listeners, records, songs), max(latest, default=None), next_counters)
+
+
+def read_existing_files(output_dir):
+    """
+    Read an existing dataset from its files: the parents from the CSV files in output_dir, where its activity ends
+    from the state of the newest directory (output_dir or a delta appended to it) that has one. Only the sessions
+    and reviews of directories after that one, written without a state, are read from their CSV files.
+    """
+    parse_id = int if IdStrategy == "int" else str
+    listeners = ColumnBatch('Listeners', {'user_id': [parse_id(user_id) for user_id, in
+                                                      read_csv('Listeners', ['user_id'], output_dir)]})
+    record_rows = list(read_csv('Records', ['record_id', 'artist_user_id'], output_dir))
+    records = ColumnBatch('Records', {'record_id': [parse_id(row[0]) for row in record_rows],
+                                      'artist_user_id': [parse_id(row[1]) for row in record_rows]})
+    song_rows = list(read_csv('Songs', ['record_id', 'track_number', 'length'], output_dir))
+    songs = ColumnBatch('Songs', {'record_id': [parse_id(row[0]) for row in song_rows],
+                                  'track_number': [int(row[1]) for row in song_rows],
+                                  'length': [int(row[2]) for row in song_rows]})
+    del record_rows, song_rows
+
+    directories = [output_dir] + delta_dirs(output_dir)
+    latest, next_counters = None, {}
+    for index in range(len(directories) - 1, -1, -1):
+        state = read_state(directories[index])
+        if state is not None:
+            latest, next_counters = state
+            directories = directories[index + 1:]
+            break
+    for model, id_column, time_column, prefix in ACTIVITY_TABLES:
+        last_id = None
+        for directory in directories:
+            for row_id, timestamp in read_csv(model.__tablename__, [id_column, time_column], directory):
+                timestamp = datetime.fromisoformat(timestamp)
+                if latest is None or timestamp > latest:
+                    latest = timestamp
+                if IdStrategy != "uuid":
+                    row_id = parse_id(row_id)
+                    if last_id is None or _last_id_key(row_id) > _last_id_key(last_id):
+                        last_id = row_id
+        if last_id is not None:
+            next_counters[prefix] = id_counter(prefix, last_id) + 1
+        elif IdStrategy != "uuid":
+            next_counters.setdefault(prefix, 1)
+    return ExistingDataset(ParentKeys.from_rows(listeners, records, songs), latest, next_counters)
+
+
+def write_state(output_dir, activity_end):
+    """
+    Write the state of a dataset (or delta directory) just generated into output_dir: activity_end, the end of the
+    time window its sessions and reviews were drawn from (none is later), and the counters the next session and
+    review ids continue from (this process's, none for "uuid" ids).
+    """
+    next_counters = {} if IdStrategy == "uuid" else {prefix: next_id(prefix) for *_, prefix in ACTIVITY_TABLES}
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, STATE_FILE_NAME)
+    # Replace the file atomically, like the checkpoint manifest
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump({'latest_activity': activity_end.isoformat(), 'next_counters': next_counters}, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_state(directory):
+    """The latest activity and next counters written by write_state into directory, or None if there are none."""
+    path = os.path.join(directory, STATE_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        state = json.load(file)
+    return datetime.fromisoformat(state['latest_activity']), state['next_counters']
+
+
+def delta_dir(output_dir, start):
+    return os.path.join(output_dir, DELTA_DIR_NAME, start.strftime('%Y%m%dT%H%M%S'))
+
+
+def delta_dirs(output_dir):
+    """The delta directories appended to a dataset so far, oldest first."""
+    root = os.path.join(output_dir, DELTA_DIR_NAME)
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, name) for name in sorted(os.listdir(root))]
+
+
+def append_config(config, start, days):
+    """
+    GeneratorConfig of `days` days of new activity from start: as many sessions, reviews and review likes per day
+    as config has over its whole activity period (EarliestSessionStartTime or RecordLatestEndDate to
+    LatestActivityTime), written into the delta directory of start.
+    """
+    window = timedelta(days=days)
+    sessions = round(config.sessions * (window / (LatestActivityTime - EarliestSessionStartTime)))
+    reviews = round(config.reviews * (window / (LatestActivityTime - RecordLatestEndDate)))
+    review_likes = round(config.review_likes * reviews / config.reviews) if config.reviews else 0
+    return dataclasses.replace(config, sessions=sessions, reviews=reviews, review_likes=review_likes,
+                               output_dir=delta_dir(config.output_dir, start))
@@ -1,49 +1,449 @@
-import csv
+import argparse
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
 
-from constants import TargetFormat
-from exports.csv import export_csvs
-from generators.listener_like_review import create_review_likes
-from generators.listener_review_record import create_reviews
-from generators.listener_session_song import create_sessions
-from generators.record_single_album_song import create_records_singles_albums_songs
-from generators.user_artist_listener import create_users_listeners_artists
-from sql.zot_music import session
+import numpy as np
 
-if __name__ == "__main__":
-    # Create genres, users, listeners, and artists and insert them into the database
-    users, listeners, artists = create_users_listeners_artists()
+from checkpoint import Checkpoint, IdLog, capture_rng_state, restore_rng_state, read_ids, current_settings
+from constants import TargetFormat, LoadMode, NumberOfShards, SessionEngine, ExportWorkers, CsvCompression, \
+    ReviewLikeEngine, Checkpointing, CheckpointDirName, Seed, ScaleFactor, GeneratorConfig, OutputDir, SqlDumpMode, \
+    DeferKeys, CatalogEngine, UserEngine, ChunkSize, AppendWindowDays, MemoryMapParentKeys, ParentKeysDirName, \
+    LatestActivityTime
+from exports.csv import CsvTableWriter, TABLE_COLUMNS, csv_paths
+from exports.mysql_dump import SqlDumpWriter, write_load_script
+from generators.listener_like_review import iter_review_likes, iter_review_like_batches
+from generators.listener_review_record import iter_reviews
+from generators.columnar import ColumnBatch
+from generators.keys import ParentKeys
+from generators.listener_session_song import iter_sessions, iter_session_batches
+from generators.parallel import ShardPool
+from generators.popularity import build_popularity
+from generators.ids import set_id_counter
+from generators.seeds import derive_seed, reseed
+from generators.record_single_album_song import create_records_singles_albums_songs, create_catalog_batches
+from generators.user_artist_listener import create_users_listeners_artists, create_user_batches
+from incremental import read_existing_database, read_existing_files, append_config, write_state
+from profiling import profiler
+from sql.async_load import AsyncInserter, get_async_database, close_async_database
+from sql.bulk_load import BulkInserter, OrmLoader, load_data_infile
+from sql.ddl import add_deferred_keys
+from sql.zot_music import get_session, User, Listener, Artist, Record, Single, Album, Song, Session, Review, ReviewLike
+
+# Tables in the order they are written, parents before the tables referencing them
+MODELS = (User, Artist, Listener, Record, Single, Album, Song, Session, Review, ReviewLike)
+# The tables generated in one piece before the child tables, in write order
+PARENT_MODELS = MODELS[:7]
+# Threads writing CSV chunks while the next chunk is generated, and several tables at once
+export_executor = ThreadPoolExecutor(max_workers=ExportWorkers)
+# CSV writers still finishing on export_executor
+pending_writes = []
+
+
+def open_sinks(model, config, positions=None, replay=False):
+    """
+    Open every sink the configuration asks for (CSV/Parquet/Arrow/SQL file and/or database loader) for one table
+    of the dataset described by config, keyed by kind. positions holds the resume position of each sink
+    (as returned by its sync()), and replay makes the database loaders replace rows an interrupted run
+    may already have committed.
+    """
+    positions = positions or {}
+    sinks = {}
+    # LOAD DATA INFILE reads the exported CSVs, so they are written in that mode as well
+    if TargetFormat == "csv" or LoadMode == "infile" or (TargetFormat == "sql" and SqlDumpMode == "infile"):
+        sinks['csv'] = CsvTableWriter(model.__tablename__, config.output_dir, executor=export_executor,
+                                      resume=positions.get('csv'))
+    if TargetFormat in ("parquet", "arrow"):
+        # Imported here so that runs writing no Parquet or Arrow files don't import pyarrow
+        from exports.parquet import ArrowTableWriter
+        sinks['arrow'] = ArrowTableWriter(model, TargetFormat, output_dir=config.output_dir)
+    if TargetFormat == "sql":
+        sinks['sql'] = SqlDumpWriter(model, config.output_dir, resume=positions.get('sql'))
+    if LoadMode == "orm":
+        sinks['orm'] = OrmLoader(get_session(db_name=config.db_name), model, replay=replay)
+    elif LoadMode == "bulk":
+        sinks['bulk'] = BulkInserter(get_session(db_name=config.db_name).get_bind(), model, replay=replay)
+    elif LoadMode == "async":
+        sinks['async'] = AsyncInserter(get_async_database(config.db_name), model, replay=replay)
+    elif LoadMode is not None and LoadMode != "infile":
+        raise ValueError(f"Unknown LoadMode: {LoadMode}")
+    return sinks
+
+
+def write_chunk(sinks, chunk):
+    for sink in sinks:
+        if isinstance(chunk, ColumnBatch):
+            sink.write_batch(chunk)
+        else:
+            sink.write(chunk)
+
+
+def close_sinks(name, sinks, wait=False):
+    for kind, sink in sinks.items():
+        closed = sink.close()
+        # Wait for the CSV writer thread when the files must be complete (checkpoint) or its time is measured
+        if isinstance(closed, Future):
+            if wait or profiler.enabled:
+                closed.result()
+            else:
+                pending_writes.append(closed)
+        if hasattr(sink, 'seconds'):
+            profiler.add(f"{kind} {name}", sink.seconds, sink.rows)
+
+
+def table_chunks(table):
+    """The chunks of a parent table generated in one piece: a ColumnBatch is split into ChunkSize rows."""
+    if isinstance(table, ColumnBatch):
+        return table.slices(ChunkSize)
+    return [table]
+
+
+def wait_for_writers():
+    """Wait until every CSV writer has finished its file."""
+    while pending_writes:
+        pending_writes.pop().result()
+
+
+def write_table(model, chunks, config, checkpoint=None, restart=None, rng=None, log_ids=None):
+    """
+    Stream chunks (lists of generators.rows rows or ColumnBatches) of one table into all sinks of the dataset described by config
+    and return the number of rows written. Tables must be written in foreign key dependency order.
+
+    With a checkpoint, progress is recorded after every chunk. A table an interrupted run finished is skipped, and a
+    partly written one continues after its last completed chunk: restart(rows, chunks) returns the remaining chunks
+    once the random state (including the NumPy generator rng, if any) is restored. Without restart, or when a sink
+    can't resume, the table is generated again from its start and the resumable sinks skip the chunks they have.
+    log_ids names an id attribute to keep in the checkpoint's IdLog of the table.
+    Every table is one profiler stage, with the generation and every sink timed separately inside it.
+    """
+    with profiler.stage(f"write {model.__tablename__}") as stats:
+        stats['rows'] = stream_table(model, chunks, config, checkpoint, restart, rng, log_ids)
+    return stats['rows']
+
+
+def stream_table(model, chunks, config, checkpoint=None, restart=None, rng=None, log_ids=None):
+    name = model.__tablename__
+    if checkpoint is None:
+        sinks = open_sinks(model, config)
+        rows = 0
+        for chunk in profiler.timed(f"generate {name}", chunks):
+            write_chunk(sinks.values(), chunk)
+            rows += len(chunk)
+        close_sinks(name, sinks)
+        return rows
+
+    progress = checkpoint.table(name)
+    if progress.get('done'):
+        restore_rng_state(progress['end_rng'], rng)
+        print(f"Skipping {name}: {progress['rows']} rows already written")
+        return progress['rows']
+
+    done_chunks = progress.get('chunks', 0)
+    positions = progress['sinks'] if done_chunks else {}
+    sinks = open_sinks(model, config, positions, replay=checkpoint.resuming)
+    if log_ids is not None:
+        sinks['ids'] = IdLog(checkpoint.id_log_path(name), log_ids, positions.get('ids'))
+
+    skip = {}
+    first_chunk, rows = 0, 0
+    if 'start_rng' not in progress:
+        checkpoint.update(name, start_rng=capture_rng_state(rng))
+    elif done_chunks and restart is not None and all(sink.resumable for sink in sinks.values()):
+        restore_rng_state(progress['rng'], rng)
+        chunks = restart(progress['rows'], done_chunks)
+        first_chunk, rows = done_chunks, progress['rows']
+        print(f"Resuming {name} after {done_chunks} chunks ({rows} rows)")
+    else:
+        restore_rng_state(progress['start_rng'], rng)
+        skip = {kind: done_chunks for kind, sink in sinks.items() if sink.resumable}
+        if done_chunks:
+            print(f"Regenerating {name} from its start; {done_chunks} written chunks are skipped where possible")
+
+    for index, chunk in enumerate(profiler.timed(f"generate {name}", chunks), start=first_chunk):
+        write_chunk([sink for kind, sink in sinks.items() if index >= skip.get(kind, 0)], chunk)
+        rows += len(chunk)
+        if index >= done_chunks:
+            checkpoint.update(name, chunks=index + 1, rows=rows, rng=capture_rng_state(rng),
+                              sinks={kind: sink.sync() for kind, sink in sinks.items()})
+    # Only mark the table done once its files are complete
+    close_sinks(name, sinks, wait=True)
+    checkpoint.finish_table(name, rows, capture_rng_state(rng))
+    return rows
 
-    # Commit genres, users, listeners, and artists first
-    session.add_all(users + artists + listeners)
-    session.commit()
+
+def collect_ids(chunks, attribute, ids):
+    """
+    Pass chunks through unchanged while remembering one id attribute of every object.
+    """
+    for chunk in chunks:
+        ids.extend(getattr(obj, attribute) for obj in chunk)
+        yield chunk
+
+
+def write_parent_tables(config, checkpoint=None):
+    """
+    Generate and write the parent tables (PARENT_MODELS) of the dataset described by config.
+    Return their row counts and the ParentKeys the child tables pick their parents from.
+    """
+    # Create genres, users, listeners, and artists and write them first.
+    # The parent tables are small and reproducible, so a resumed run that can't reuse their saved keys
+    # generates them again but skips writing them.
+    with profiler.stage('create_users_listeners_artists') as stats:
+        if UserEngine == "numpy":
+            users, listeners, artists = create_user_batches(config)
+        else:
+            users, listeners, artists = create_users_listeners_artists(config)
+        stats['rows'] = len(users) + len(listeners) + len(artists)
+    user_count = write_table(User, table_chunks(users), config, checkpoint)
+    artist_count = write_table(Artist, table_chunks(artists), config, checkpoint)
+    listener_count = write_table(Listener, table_chunks(listeners), config, checkpoint)
+    del users
 
     # Create records, singles, albums, and songs
-    records, singles, albums, songs = create_records_singles_albums_songs(artists)
+    with profiler.stage('create_records_singles_albums_songs') as stats:
+        if CatalogEngine == "numpy":
+            records, singles, albums, songs = create_catalog_batches(artists, config)
+        else:
+            records, singles, albums, songs = create_records_singles_albums_songs(artists, config)
+        stats['rows'] = len(records) + len(singles) + len(albums) + len(songs)
+    record_count = write_table(Record, table_chunks(records), config, checkpoint)
+    single_count = write_table(Single, table_chunks(singles), config, checkpoint)
+    album_count = write_table(Album, table_chunks(albums), config, checkpoint)
+    song_count = write_table(Song, table_chunks(songs), config, checkpoint)
+
+    with profiler.stage('build_parent_keys') as stats:
+        keys = ParentKeys.from_rows(listeners, records, songs)
+        stats['rows'] = keys.listener_count + len(keys.record_ids) + keys.song_count
+    return (user_count, artist_count, listener_count, record_count, single_count, album_count, song_count), keys
+
+
+def generate_dataset(config):
+    """
+    Generate one dataset of the size given by config and write (or load) it into every sink.
+    The random streams are reseeded first, so the dataset is the same as in a run of its own.
+    """
+    print(f"Generating scale factor {config.scale_factor:g}: {config}")
+    reseed(Seed)
+    checkpoint = Checkpoint(os.path.join(config.output_dir, CheckpointDirName), config) if Checkpointing else None
+    resuming = checkpoint is not None and checkpoint.resuming
+    if LoadMode is not None:
+        # A resumed run keeps the rows that are already loaded
+        get_session(keep_tables=resuming, db_name=config.db_name, defer_keys=DeferKeys)
+    profiler.dataset = f'sf{config.scale_factor:g}'
+
+    keys_dir = os.path.join(config.output_dir, ParentKeysDirName)
+    if MemoryMapParentKeys and checkpoint is not None and checkpoint.table('ParentKeys').get('done'):
+        # The parent tables are written and their keys saved: skip them (restoring the random state after them)
+        parent_counts = [write_table(model, [], config, checkpoint) for model in PARENT_MODELS]
+        keys = ParentKeys.load(keys_dir)
+        print(f"Reusing the parent keys saved in {keys_dir}")
+    else:
+        parent_counts, keys = write_parent_tables(config, checkpoint)
+        if MemoryMapParentKeys:
+            with profiler.stage('save_parent_keys'):
+                keys.save(keys_dir)
+            if checkpoint is not None:
+                checkpoint.update('ParentKeys', done=True)
+            keys = ParentKeys.load(keys_dir)
+    user_count, artist_count, listener_count, record_count, single_count, album_count, song_count = parent_counts
+
+    # Stream the large tables chunk by chunk. They pick their parents by index from ParentKeys,
+    # so only a few arrays of parent keys stay in memory (or are memory-mapped), not the parent rows.
+    # Review likes only need the review ids, not the review rows; with checkpointing they are kept on disk.
+    review_ids = []
+    with profiler.stage('build_popularity'):
+        popularity = build_popularity(keys)
+    if NumberOfShards > 1:
+        pool = ShardPool(keys, popularity)
+        session_count = write_table(
+            Session, pool.sessions(config.sessions), config, checkpoint,
+            restart=lambda rows, chunks: pool.sessions(config.sessions, first_chunk=chunks))
+        if checkpoint is None:
+            review_count = write_table(Review, collect_ids(pool.reviews(config.reviews), 'review_id', review_ids),
+                                       config)
+        else:
+            review_count = write_table(
+                Review, pool.reviews(config.reviews), config, checkpoint, log_ids='review_id',
+                restart=lambda rows, chunks: pool.reviews(config.reviews, first_chunk=chunks))
+            review_ids = read_ids(checkpoint.id_log_path('Reviews'))
+        review_like_count = write_table(
+            ReviewLike, pool.review_likes(review_ids, config.review_likes), config, checkpoint,
+            restart=lambda rows, chunks: pool.review_likes(review_ids, config.review_likes, first_chunk=chunks))
+        pool.close()
+    else:
+        if SessionEngine == "numpy":
+            session_rng = np.random.default_rng(derive_seed(Seed, 'sessions'))
+            session_count = write_table(
+                Session, iter_session_batches(keys, count=config.sessions, popularity=popularity, rng=session_rng),
+                config, checkpoint,
+                restart=lambda rows, chunks: iter_session_batches(keys, count=config.sessions - rows,
+                                                                  popularity=popularity, rng=session_rng),
+                rng=session_rng)
+        else:
+            session_count = write_table(
+                Session, iter_sessions(keys, count=config.sessions, popularity=popularity), config, checkpoint,
+                restart=lambda rows, chunks: iter_sessions(keys, count=config.sessions - rows, popularity=popularity))
+        reviews = iter_reviews(keys, count=config.reviews, popularity=popularity)
+        if checkpoint is None:
+            review_count = write_table(Review, collect_ids(reviews, 'review_id', review_ids), config)
+        else:
+            review_count = write_table(
+                Review, reviews, config, checkpoint, log_ids='review_id',
+                restart=lambda rows, chunks: iter_reviews(keys, count=config.reviews - rows, popularity=popularity))
+            review_ids = read_ids(checkpoint.id_log_path('Reviews'))
+        # Likes are drawn for all reviews at once, so an interrupted table is generated again from its start
+        if ReviewLikeEngine == "numpy":
+            review_likes = iter_review_like_batches(review_ids, keys, count=config.review_likes)
+        else:
+            review_likes = iter_review_likes(review_ids, keys, count=config.review_likes)
+        review_like_count = write_table(ReviewLike, review_likes, config, checkpoint)
+
+    # Wait for the CSV writers to finish
+    with profiler.stage('wait for CSV writers'):
+        wait_for_writers()
+    if TargetFormat == "csv":
+        # Where the activity ends and the id counters stand, so an append run needn't read the activity files
+        write_state(config.output_dir, LatestActivityTime)
+    if TargetFormat == "sql":
+        write_load_script([model.__tablename__ for model in MODELS], config.output_dir)
 
-    # Commit records, singles, albums, and songs
-    session.add_all(records + singles + albums + songs)
-    session.commit()
+    print(f"Created {user_count} users, {listener_count} listeners, {artist_count} artists, {record_count} records, "
+          f"{single_count} singles, {album_count} albums, {song_count} songs, {session_count} sessions, "
+          f"{review_count} reviews, {review_like_count} review likes.")
 
-    # Create sessions and commit them
-    sessions = create_sessions(listeners, songs)
-    session.add_all(sessions)
-    session.commit()
+    if LoadMode == "async":
+        close_async_database(config.db_name)
 
-    # Create reviews and commit them
-    reviews = create_reviews(listeners, records)
-    session.add_all(reviews)
-    session.commit()
+    if LoadMode == "infile":
+        engine = get_session(db_name=config.db_name).get_bind()
+        for model in MODELS:
+            table_name = model.__tablename__
+            step = f'{table_name}:infile'
+            loaded_parts = checkpoint.table(step).get('parts', 0) if checkpoint is not None else 0
+            for part, path in enumerate(csv_paths(table_name, config.output_dir)):
+                if part < loaded_parts:
+                    continue
+                # The part after the last recorded one may have been committed just before an interruption
+                with profiler.stage(f"LOAD DATA {table_name}") as stats:
+                    stats['rows'] = load_data_infile(engine, model, path, TABLE_COLUMNS[table_name],
+                                                     replace=resuming and part == loaded_parts)
+                if checkpoint is not None:
+                    checkpoint.update(step, parts=part + 1)
 
-    # Create review likes and commit them
-    review_likes = create_review_likes(reviews, listeners)
-    session.add_all(review_likes)
-    session.commit()
+    if LoadMode is not None and DeferKeys:
+        # Build the indexes and foreign keys left out of the bare tables, each table in one pass
+        engine = get_session(db_name=config.db_name).get_bind()
+        for model in MODELS:
+            table_name = model.__tablename__
+            step = f'{table_name}:keys'
+            if checkpoint is not None and checkpoint.table(step).get('done'):
+                continue
+            with profiler.stage(f"add keys {table_name}"):
+                seconds = add_deferred_keys(engine, model.__table__)
+            if seconds is not None:
+                print(f"Added the indexes and foreign keys of {table_name} in {seconds:.2f}s")
+            if checkpoint is not None:
+                checkpoint.update(step, done=True)
 
-    print(f"Created {len(users)} users, {len(listeners)} listeners, {len(artists)} artists, {len(records)} records, "
-          f"{len(singles)} singles, {len(albums)} albums, {len(songs)} songs, {len(sessions)} sessions, "
-          f"{len(reviews)} reviews, {len(review_likes)} review likes.")
+    if checkpoint is not None:
+        checkpoint.finish()
 
-    # Export CSVs if the target format is CSV
+
+def append_dataset(config, days):
+    """
+    Extend the dataset described by config with `days` days of new sessions, reviews and likes of the new reviews,
+    starting right after its latest session or review. Parents and ids are read from the database (when LoadMode is
+    set) or from the CSV files; the new rows are added to the database tables and written as files into a delta
+    directory (see incremental.py). Appending isn't checkpointed.
+    """
+    if TargetFormat == "sql":
+        raise ValueError('Appending doesn\'t support TargetFormat = "sql": its scripts recreate the tables')
+    profiler.dataset = f'sf{config.scale_factor:g}'
+    with profiler.stage('read existing dataset') as stats:
+        if LoadMode is not None:
+            existing = read_existing_database(get_session(keep_tables=True, db_name=config.db_name,
+                                                          defer_keys=DeferKeys).get_bind())
+        elif TargetFormat == "csv":
+            existing = read_existing_files(config.output_dir)
+        else:
+            raise ValueError('Appending reads the existing dataset from the database (LoadMode) or from its CSV files')
+        keys = existing.keys
+        stats['rows'] = keys.listener_count + len(keys.record_ids) + keys.song_count
+    if not keys.listener_count or not keys.song_count:
+        raise ValueError(f"No existing dataset with listeners and songs to append to ({config})")
+
+    start = existing.window_start()
+    end = start + timedelta(days=days)
+    delta = append_config(config, start, days)
+    print(f"Appending {delta.sessions} sessions, {delta.reviews} reviews and {delta.review_likes} review likes "
+          f"from {start} to {end} into {delta.output_dir}")
+    # Every window draws from streams of its own, and counter ids continue after the existing ones
+    seed = derive_seed(Seed, 'append', start.isoformat())
+    reseed(seed)
+    for prefix, counter in existing.next_counters.items():
+        set_id_counter(prefix, counter)
+
+    with profiler.stage('build_popularity'):
+        popularity = build_popularity(keys)
+    if SessionEngine == "numpy":
+        sessions = iter_session_batches(keys, count=delta.sessions, seed=seed, popularity=popularity,
+                                        start_time=start, end_time=end)
+    else:
+        sessions = iter_sessions(keys, count=delta.sessions, popularity=popularity, start_time=start, end_time=end)
+    session_count = write_table(Session, sessions, delta)
+    review_ids = []
+    reviews = iter_reviews(keys, count=delta.reviews, popularity=popularity, start_time=start, end_time=end)
+    review_count = write_table(Review, collect_ids(reviews, 'review_id', review_ids), delta)
+    if ReviewLikeEngine == "numpy":
+        review_likes = iter_review_like_batches(review_ids, keys, count=delta.review_likes, seed=seed)
+    else:
+        review_likes = iter_review_likes(review_ids, keys, count=delta.review_likes)
+    review_like_count = write_table(ReviewLike, review_likes, delta)
+
+    with profiler.stage('wait for CSV writers'):
+        wait_for_writers()
     if TargetFormat == "csv":
-        export_csvs(users, listeners, artists, records, singles, albums, songs, sessions, reviews, review_likes)
\ No newline at end of file
+        write_state(delta.output_dir, end)
+    if LoadMode == "async":
+        close_async_database(config.db_name)
+    if LoadMode == "infile":
+        engine = get_session(db_name=config.db_name).get_bind()
+        for model in (Session, Review, ReviewLike):
+            for path in csv_paths(model.__tablename__, delta.output_dir):
+                with profiler.stage(f"LOAD DATA {model.__tablename__}") as stats:
+                    stats['rows'] = load_data_infile(engine, model, path, TABLE_COLUMNS[model.__tablename__])
+    print(f"Appended {session_count} sessions, {review_count} reviews, {review_like_count} review likes.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the Zot Music dataset configured in constants.py")
+    parser.add_argument('--scale-factor', type=float, nargs='+', default=[ScaleFactor],
+                        help="dataset size(s) relative to the counts in constants.py; several scale factors "
+                             "are generated one after the other into sf<N> subdirectories (and databases)")
+    parser.add_argument('--profile', action='store_true',
+                        help="report wall time, rows/s, peak RSS and allocations of every stage")
+    parser.add_argument('--profile-output',
+                        help="where --profile writes its JSON report (default: profile.json in the output directory)")
+    parser.add_argument('--trace-malloc', action='store_true',
+                        help="with --profile, also trace allocations with tracemalloc (much slower)")
+    parser.add_argument('--append', type=float, nargs='?', const=AppendWindowDays, metavar='DAYS',
+                        help="instead of generating the dataset, add DAYS (default AppendWindowDays) days of new "
+                             "sessions, reviews and review likes after its latest activity")
+    args = parser.parse_args()
+    if args.profile:
+        profiler.enable(trace_malloc=args.trace_malloc)
+
+    if (LoadMode == "infile" or (TargetFormat == "sql" and SqlDumpMode == "infile")) and CsvCompression is not None:
+        raise ValueError("LOAD DATA INFILE needs uncompressed CSVs (set CsvCompression = None)")
+
+    # Text pools and the loaded modules are reused by every dataset
+    for config in GeneratorConfig.for_scale_factors(args.scale_factor):
+        if args.append is None:
+            generate_dataset(config)
+        else:
+            append_dataset(config, args.append)
+    export_executor.shutdown()
+
+    profiler.report()
+    profiler.save(args.profile_output or os.path.join(OutputDir, 'profile.json'),
+                  current_settings())
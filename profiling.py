@@ -0,0 +1,184 @@
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is then not reported
+    resource = None
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux only); return whether it worked."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """
+    Peak resident set size in MB: VmHWM since the last reset on Linux, otherwise the peak of the whole process.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Profiler:
+    """
+    Collects per-stage wall time, rows/sec, peak RSS and memory block counts of a run and writes them as a JSON report.
+    Does nothing until enable() is called, so the instrumented code paths cost (almost) nothing by default.
+
+    Stages don't nest: a stage() covers one top-level step (a generator call, one table being written, a load);
+    add() and timed() record finer steps inside it (generation vs. every sink) by time and rows only.
+    Memory fields of a stage in the report:
+      "live_blocks_delta"  - live memory blocks at the end of the stage minus those at its start
+                             (sys.getallocatedblocks); zero or negative for a stage that frees what it allocates
+      "traced_peak_mb"     - with trace_malloc: peak of the memory traced by tracemalloc during the stage
+      "traced_allocations" - with trace_malloc: memory blocks allocated during the stage and still alive at its end,
+                             from tracemalloc snapshots at its start and end (the growth of the block count of every
+                             source line that allocated more than it freed); blocks freed within the stage are not
+                             counted, as tracemalloc only keeps the live ones
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_malloc = False
+        self.stages = []
+        self.current = None
+        # Label of the dataset being generated, when a run generates several
+        self.dataset = None
+        self.started = None
+
+    def enable(self, trace_malloc=False):
+        self.enabled = True
+        self.trace_malloc = trace_malloc
+        self.started = time.perf_counter()
+        if trace_malloc:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Measure one stage. The yielded dict can be updated inside the block, e.g. stats['rows'] = n.
+        """
+        stats = {'stage': name, 'dataset': self.dataset, 'rows': rows}
+        if not self.enabled:
+            yield stats
+            return
+        # Listed before the steps recorded inside it
+        self.stages.append(stats)
+        self.current = name
+        rss_reset = _reset_peak_rss()
+        if self.trace_malloc:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+        # Counted after the snapshot, which stays alive until the end of the stage
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] = time.perf_counter() - start
+            stats['peak_rss_mb'] = _peak_rss_mb()
+            stats['peak_rss_is_per_stage'] = rss_reset
+            stats['live_blocks_delta'] = sys.getallocatedblocks() - blocks
+            if self.trace_malloc:
+                stats['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                stats['traced_allocations'] = sum(
+                    stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+                    if stat.count_diff > 0)
+            self._add_rate(stats)
+            self.current = None
+
+    def add(self, name, seconds, rows=None):
+        """Record a step of the current stage that was timed elsewhere (e.g. by a sink)."""
+        if self.enabled:
+            stats = {'stage': name, 'dataset': self.dataset, 'parent': self.current, 'rows': rows, 'seconds': seconds}
+            self._add_rate(stats)
+            self.stages.append(stats)
+
+    def timed(self, name, chunks):
+        """
+        Pass chunks through, timing only the work done to produce them (i.e. the generator itself),
+        and record it as one step when the iterator is exhausted. Lists are already generated and pass through.
+        """
+        if not self.enabled or isinstance(chunks, list):
+            yield from chunks
+            return
+        seconds = 0.0
+        rows = 0
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(iterator, None)
+            seconds += time.perf_counter() - start
+            if chunk is None:
+                break
+            rows += len(chunk)
+            yield chunk
+        self.add(name, seconds, rows)
+
+    @staticmethod
+    def _add_rate(stats):
+        rows, seconds = stats['rows'], stats['seconds']
+        stats['rows_per_second'] = rows / seconds if rows is not None and seconds > 0 else None
+
+    def report(self):
+        """Print one line per stage, with the steps inside a stage indented below it."""
+        if not self.enabled:
+            return
+        print(f"{'stage':<40} {'seconds':>9} {'rows':>11} {'rows/s':>12} {'peak RSS MB':>12} {'live blocks':>11}")
+        dataset = None
+        for stats in self.stages:
+            if stats['dataset'] != dataset:
+                dataset = stats['dataset']
+                print(f"[{dataset}]")
+            rows = '' if stats['rows'] is None else f"{stats['rows']:,}"
+            rate = '' if stats['rows_per_second'] is None else f"{stats['rows_per_second']:,.0f}"
+            rss = '' if stats.get('peak_rss_mb') is None else f"{stats['peak_rss_mb']:,.1f}"
+            blocks = f"{stats['live_blocks_delta']:+,}" if 'live_blocks_delta' in stats else ''
+            name = f"  {stats['stage']}" if stats.get('parent') else stats['stage']
+            print(f"{name:<40} {stats['seconds']:>9.3f} {rows:>11} {rate:>12} {rss:>12} {blocks:>11}")
+
+    def save(self, path, settings=None):
+        """
+        Write the machine-readable report: environment, the given settings and every stage in order.
+        """
+        if not self.enabled:
+            return
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': settings or {},
+            'total_seconds': time.perf_counter() - self.started,
+            'stages': self.stages,
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2, default=str)
+        print(f"Saved profile to {path}")
+
+
+# Shared profiler of the run; main.py enables it with --profile
+profiler = Profiler()
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from constants import MySQLAsyncDBUrl, BulkInsertBatchSize, AsyncConnections, AsyncMaxPendingBatches
+from sql.bulk_load import objects_to_rows, delete_keys, report_throughput
+
+
+class AsyncDatabase:
+    """
+    A SQLAlchemy AsyncEngine with a pool of connections, run by an event loop on a thread of its own, so rows are
+    inserted while the caller generates the next ones. At most `connections` statements run at once (SQLite,
+    which has a single writer, gets one).
+    """
+
+    def __init__(self, url, connections=AsyncConnections):
+        self.engine = create_async_engine(url, pool_size=connections, max_overflow=0)
+        self.connections = 1 if self.engine.dialect.name == 'sqlite' else connections
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='async-db', daemon=True)
+        self.thread.start()
+        self.slots = self.submit(self._create_slots()).result()
+
+    async def _create_slots(self):
+        # Created on the loop that uses it
+        return asyncio.Semaphore(self.connections)
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the loop and return its concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def execute(self, statement, rows):
+        """Run statement (with the list of parameter dictionaries rows) in a transaction of its own."""
+        async with self.slots:
+            async with self.engine.begin() as connection:
+                await connection.execute(statement, rows)
+
+    async def delete_keys(self, table, keys):
+        async with self.slots:
+            async with self.engine.begin() as connection:
+                await connection.run_sync(delete_keys, table, keys)
+
+    def close(self):
+        self.submit(self.engine.dispose()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# Shared AsyncDatabase per database, created by get_async_database() the first time a sink needs it
+_databases = {}
+
+
+def get_async_database(db_name, url=MySQLAsyncDBUrl):
+    """
+    Return the shared AsyncDatabase of a database. The tables must already exist (see sql.zot_music.get_session).
+    """
+    if db_name not in _databases:
+        _databases[db_name] = AsyncDatabase(f"{url}/{db_name}")
+    return _databases[db_name]
+
+
+def close_async_database(db_name):
+    """Dispose of the connection pool of a database and stop its event loop, if it was opened."""
+    database = _databases.pop(db_name, None)
+    if database is not None:
+        database.close()
+
+
+class AsyncInserter:
+    """
+    Insert generated rows (or ORM objects) of one table like BulkInserter, but through an AsyncDatabase:
+    every batch of batch_size rows is inserted and committed on a pooled connection while write() returns
+    to the caller, and several batches are inserted at once. At most max_pending batches are queued or
+    running; write() waits for the oldest beyond that, so a slow database holds back generation instead of
+    filling memory. sync() waits until every row written so far is committed.
+
+    seconds is the wall time from the first batch until the last one was committed.
+    With replay=True the first chunk first deletes any rows with the same primary keys, like BulkInserter.
+    """
+
+    resumable = True
+
+    def __init__(self, database, model, batch_size=BulkInsertBatchSize, max_pending=AsyncMaxPendingBatches,
+                 replay=False):
+        self.database = database
+        self.model = model
+        self.table = model.__table__
+        self.statement = self.table.insert()
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.replay = replay
+        self.batch = []
+        self.pending = deque()
+        self.rows = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def seconds(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def write(self, objects):
+        self._add(objects_to_rows(self.model, objects))
+
+    def write_batch(self, batch):
+        self._add(batch.dicts())
+
+    def _add(self, rows):
+        if self.replay:
+            rows = list(rows)
+            keys = [tuple(row[column.key] for column in self.table.primary_key.columns) for row in rows]
+            self.database.submit(self.database.delete_keys(self.table, keys)).result()
+            self.replay = False
+        for row in rows:
+            self.batch.append(row)
+            if len(self.batch) >= self.batch_size:
+                self._submit()
+
+    async def _insert(self, rows):
+        await self.database.execute(self.statement, rows)
+        self.finished = time.perf_counter()
+
+    def _submit(self):
+        # Backpressure: wait for the oldest batch (raising its error, if any) once the queue is full
+        while len(self.pending) >= self.max_pending:
+            self.pending.popleft().result()
+        if self.started is None:
+            self.started = time.perf_counter()
+        self.pending.append(self.database.submit(self._insert(self.batch)))
+        self.rows += len(self.batch)
+        self.batch = []
+
+    def sync(self):
+        """Insert the partial batch and wait until every batch is committed."""
+        if self.batch:
+            self._submit()
+        while self.pending:
+            self.pending.popleft().result()
+        return None
+
+    def close(self):
+        self.sync()
+        report_throughput(self.table.name, self.rows, self.seconds)
+        return self.rows
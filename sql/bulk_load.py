@@ -0,0 +1,218 @@
+import itertools
+import os
+import time
+
+from sqlalchemy import create_engine, text, tuple_
+
+from constants import BulkInsertBatchSize
+
+
+def report_throughput(table_name, rows, seconds):
+    """
+    Print how many rows were loaded into a table and the resulting rows per second.
+    """
+    rate = rows / seconds if seconds > 0 else float('inf')
+    print(f"Loaded {rows} rows into {table_name} in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+
+def objects_to_rows(model, objects):
+    """
+    Turn generated rows (generators.rows) or ORM objects into plain column dictionaries suitable for a Core
+    executemany insert.
+    """
+    objects = iter(objects)
+    first = next(objects, None)
+    if first is None:
+        return iter(())
+    if isinstance(first, tuple):
+        fields = first._fields
+        return (dict(zip(fields, row)) for row in itertools.chain((first,), objects))
+    columns = [column.key for column in model.__table__.columns]
+    return ({key: getattr(obj, key) for key in columns} for obj in itertools.chain((first,), objects))
+
+
+def delete_keys(connection, table, keys, batch_size=BulkInsertBatchSize):
+    """
+    Delete the rows of a table whose primary keys (tuples in primary key column order) are in keys.
+    Works with a Connection or a Session; the caller commits.
+    """
+    primary_key = list(table.primary_key.columns)
+    for start in range(0, len(keys), batch_size):
+        part = keys[start:start + batch_size]
+        if len(primary_key) == 1:
+            condition = primary_key[0].in_([key[0] for key in part])
+        else:
+            condition = tuple_(*primary_key).in_(part)
+        connection.execute(table.delete().where(condition))
+
+
+class BulkInserter:
+    """
+    Insert generated rows (or ORM objects) of one table with Core insert() executemany, bypassing the ORM
+    unit of work. Rows can be written in any number of chunks; every batch is committed on its own so the
+    transaction size stays bounded. close() reports the table's throughput.
+
+    With replay=True the first chunk first deletes any rows with the same primary keys, so a chunk that
+    was (partly) committed before an interrupted run stopped can be written again.
+    """
+
+    resumable = True
+
+    def __init__(self, engine, model, batch_size=BulkInsertBatchSize, replay=False):
+        self.model = model
+        self.table = model.__table__
+        self.statement = self.table.insert()
+        self.batch_size = batch_size
+        self.connection = engine.connect()
+        self.replay = replay
+        self.batch = []
+        self.rows = 0
+        self.seconds = 0.0
+
+    def write(self, objects):
+        self._add(objects_to_rows(self.model, objects))
+
+    def write_batch(self, batch):
+        self._add(batch.dicts())
+
+    def _replay(self, rows):
+        rows = list(rows)
+        keys = [tuple(row[column.key] for column in self.table.primary_key.columns) for row in rows]
+        delete_keys(self.connection, self.table, keys)
+        self.replay = False
+        return rows
+
+    def _add(self, rows):
+        if self.replay:
+            rows = self._replay(rows)
+        for row in rows:
+            self.batch.append(row)
+            if len(self.batch) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        start = time.perf_counter()
+        self.connection.execute(self.statement, self.batch)
+        self.connection.commit()
+        self.seconds += time.perf_counter() - start
+        self.rows += len(self.batch)
+        self.batch = []
+
+    def sync(self):
+        """Commit the partial batch, so every row written so far is in the database."""
+        if self.batch:
+            self._flush()
+        return None
+
+    def close(self):
+        if self.batch:
+            self._flush()
+        self.connection.close()
+        report_throughput(self.table.name, self.rows, self.seconds)
+        return self.rows
+
+
+class OrmLoader:
+    """
+    Add and commit ORM objects of one table through the session, one commit per chunk. Generated rows
+    (generators.rows) are turned into ORM objects here, the only sink that needs them.
+    replay=True deletes the rows of the first chunk first, like BulkInserter.
+    """
+
+    resumable = True
+
+    def __init__(self, session, model, replay=False):
+        self.session = session
+        self.model = model
+        self.table_name = model.__tablename__
+        self.replay = replay
+        self.rows = 0
+        self.seconds = 0.0
+
+    def write(self, objects):
+        start = time.perf_counter()
+        if self.replay:
+            primary_key = self.model.__table__.primary_key.columns
+            keys = [tuple(getattr(obj, column.key) for column in primary_key) for obj in objects]
+            delete_keys(self.session, self.model.__table__, keys)
+            self.replay = False
+        if objects and isinstance(objects[0], tuple):
+            objects = [self.model(**row._asdict()) for row in objects]
+        self.session.add_all(objects)
+        self.session.commit()
+        self.seconds += time.perf_counter() - start
+        self.rows += len(objects)
+
+    def write_batch(self, batch):
+        self.write([self.model(**row) for row in batch.dicts()])
+
+    def sync(self):
+        # Every chunk is already committed
+        return None
+
+    def close(self):
+        report_throughput(self.table_name, self.rows, self.seconds)
+        return self.rows
+
+
+def bulk_insert(engine, model, objects, batch_size=BulkInsertBatchSize):
+    """
+    Insert generated rows or ORM objects with Core insert() executemany in batches of batch_size.
+
+    :param engine: Engine bound to the target database
+    :param model: Mapped class the objects belong to
+    :param objects: Iterable of rows or objects of that table
+    :param batch_size: Number of rows per executemany call
+    :return: Number of rows inserted
+    """
+    inserter = BulkInserter(engine, model, batch_size)
+    inserter.write(objects)
+    return inserter.close()
+
+
+def load_data_sql(table, csv_path, columns, replace=False):
+    """
+    LOAD DATA LOCAL INFILE statement reading a CSV written by CsvTableWriter into a table.
+    Empty fields of nullable columns are loaded as NULL, matching how the CSV writer renders None.
+    A relative csv_path is resolved by the client against its working directory.
+    """
+    path = csv_path.replace('\\', '\\\\').replace("'", "\\'")
+    variables = ', '.join(f'@{column}' for column in columns)
+    assignments = ', '.join(
+        f"`{column}` = NULLIF(@{column}, '')" if table.columns[column].nullable else f'`{column}` = @{column}'
+        for column in columns
+    )
+    return (
+        f"LOAD DATA LOCAL INFILE '{path}' {'REPLACE ' if replace else ''}INTO TABLE `{table.name}` CHARACTER SET utf8mb4 "
+        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+        "LINES TERMINATED BY '\\r\\n' IGNORE 1 LINES "
+        f"({variables}) SET {assignments}"
+    )
+
+
+def load_data_infile(engine, model, csv_path, columns, replace=False):
+    """
+    Load a CSV written by exports.csv.save_to_csv with MySQL's LOAD DATA LOCAL INFILE.
+    Empty fields of nullable columns are loaded as NULL, matching how the CSV writer renders None.
+    With replace=True, rows replace existing rows with the same primary key instead of failing.
+
+    :param engine: Engine bound to the target MySQL database
+    :param model: Mapped class of the target table
+    :param csv_path: Path of the CSV file (with a header line)
+    :param columns: Column names in the order they appear in the CSV
+    :param replace: Replace rows with duplicate keys (used when loading a file again)
+    :return: Number of rows loaded
+    """
+    table = model.__table__
+    statement = text(load_data_sql(table, os.path.abspath(csv_path), columns, replace))
+
+    # The client has to opt in to sending local files
+    infile_engine = create_engine(engine.url, connect_args={"local_infile": True})
+    start = time.perf_counter()
+    with infile_engine.connect() as connection:
+        rows = connection.execute(statement).rowcount
+        connection.commit()
+    infile_engine.dispose()
+
+    report_throughput(table.name, rows, time.perf_counter() - start)
+    return rows
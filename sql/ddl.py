@@ -0,0 +1,81 @@
+import time
+
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+# DDL is rendered for MySQL unless another dialect is given
+MYSQL_DIALECT = mysql.dialect()
+
+
+def supports_deferred_foreign_keys(dialect):
+    """Whether foreign keys can be added to an existing table with ALTER TABLE (MySQL can, SQLite can't)."""
+    return dialect.name in ('mysql', 'mariadb')
+
+
+def bare_table(table, dialect=MYSQL_DIALECT):
+    """
+    CREATE TABLE of a table with only its columns and primary key, so rows load without maintaining secondary
+    indexes or checking foreign keys; deferred_keys_sql adds them afterwards. Databases that can't add foreign keys
+    later get them right away.
+    """
+    return CreateTable(table, include_foreign_key_constraints=[] if supports_deferred_foreign_keys(dialect) else None)
+
+
+def create_table_sql(table, dialect=MYSQL_DIALECT):
+    """The bare_table statement as SQL text."""
+    return str(bare_table(table, dialect).compile(dialect=dialect)).strip()
+
+
+def deferred_keys_sql(table, dialect=MYSQL_DIALECT, existing_indexes=(), existing_foreign_keys=()):
+    """
+    Statements adding the secondary indexes and foreign keys that bare_table left out of a table: one ALTER TABLE
+    that builds all of them in a single pass on MySQL, one CREATE INDEX per index elsewhere.
+    Indexes named in existing_indexes and foreign keys on the column tuples in existing_foreign_keys are skipped.
+    Empty if there is nothing to add.
+    """
+    indexes = sorted((index for index in table.indexes if index.name not in existing_indexes),
+                     key=lambda index: index.name)
+    if not supports_deferred_foreign_keys(dialect):
+        return [str(CreateIndex(index).compile(dialect=dialect)).strip() for index in indexes]
+
+    quote = dialect.identifier_preparer.quote
+    compiler = dialect.ddl_compiler(dialect, None)
+    clauses = []
+    for index in indexes:
+        columns = ', '.join(quote(column.name) for column in index.columns)
+        clauses.append(f"ADD {'UNIQUE ' if index.unique else ''}INDEX {quote(index.name)} ({columns})")
+    for constraint in sorted(table.foreign_key_constraints, key=lambda constraint: constraint.column_keys):
+        if tuple(constraint.column_keys) in existing_foreign_keys:
+            continue
+        clauses.append(f'ADD {compiler.visit_foreign_key_constraint(constraint)}')
+    if not clauses:
+        return []
+    return [f"ALTER TABLE {quote(table.name)} " + ', '.join(clauses)]
+
+
+def create_bare_tables(engine, metadata):
+    """Create the tables of metadata that don't exist yet as bare tables (see bare_table)."""
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing:
+                connection.execute(bare_table(table, engine.dialect))
+
+
+def add_deferred_keys(engine, table):
+    """
+    Add the secondary indexes and foreign keys of a table created by create_bare_tables, except those it already
+    has (e.g. added just before an interrupted run stopped). Return the seconds it took, or None if nothing was added.
+    """
+    inspector = inspect(engine)
+    existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+    existing_foreign_keys = {tuple(key['constrained_columns']) for key in inspector.get_foreign_keys(table.name)}
+    statements = deferred_keys_sql(table, engine.dialect, existing_indexes, existing_foreign_keys)
+    if not statements:
+        return None
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    return time.perf_counter() - start